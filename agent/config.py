@@ -7,6 +7,9 @@ load_dotenv()
 class Config:
     # Anthropic
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+    # Quiet cycles go to the fast model; regime changes escalate to the deep one
+    FAST_MODEL = os.getenv("FAST_MODEL", "claude-haiku-4-5-20251001")
+    DEEP_MODEL = os.getenv("DEEP_MODEL", "claude-sonnet-4-20250514")
 
     # Deribit
     DERIBIT_CLIENT_ID = os.getenv("DERIBIT_CLIENT_ID", "")
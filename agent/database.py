@@ -3,23 +3,85 @@
 import sqlite3
 import json
 import os
-from datetime import datetime, timezone
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from .config import Config
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Free-text columns that get a <column>_zst BLOB sibling. Once a dictionary has
+# been trained, new values are stored there zstd-compressed (when that is
+# smaller) and the TEXT column is left empty; readers inflate transparently.
+_ZSTD_COLUMNS = {"agent_insights": ("analysis", "reasoning"), "trades": ("notes",)}
+_ZSTD_DICT_SIZE = 16384
+_ZSTD_MIN_SAMPLES = 200  # rows of prose needed before training is worthwhile
+_ZSTD_MAX_SAMPLES = 500
+_ZSTD_RETRAIN_EVERY = 25  # saves between training attempts while below the threshold
+
+_zstd_compressor = None  # set by _init_zstd once a dictionary exists
+_zstd_untrained_saves = 0
+_zstd_dicts: dict = {}  # dict_id -> ZstdCompressionDict
+
+
+def _dumps(obj) -> str:
+    """Serialize obj to a JSON string (orjson when available; numpy scalars allowed)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC).decode()
+    return json.dumps(obj)
+
+
+def _loads(text):
+    """Parse a JSON string or bytes (orjson when available)."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
 
 def get_db(db_path: Optional[str] = None) -> sqlite3.Connection:
     path = db_path or Config.DB_PATH
     conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL: fsync at checkpoints, not every commit
+    conn.execute("PRAGMA temp_store=MEMORY")
     conn.execute("PRAGMA foreign_keys=ON")
+    migrate_db(conn)
     return conn
 
 
+def migrate_db(conn: sqlite3.Connection):
+    """Add the columns newer code reads to tables created by older versions.
+
+    Tables that don't exist yet are left to init_db.
+    """
+    altered = False
+    for table, columns in _ZSTD_COLUMNS.items():
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            continue
+        for col in columns:
+            if f"{col}_zst" not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col}_zst BLOB")
+                altered = True
+    if altered:
+        conn.commit()
+
+
 def init_db(conn: sqlite3.Connection):
-    """Create all tables if they don't exist."""
+    """Create all tables if they don't exist.
+
+    With zstandard installed, analysis / reasoning / notes may be stored in their
+    *_zst sibling with the TEXT column left blank; read them through the
+    get_* helpers (or inflate the BLOB) rather than selecting the TEXT column.
+    """
     conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS market_snapshots (
@@ -52,7 +114,10 @@ def init_db(conn: sqlite3.Connection):
             recommended_action TEXT CHECK(recommended_action IN ('SHORT', 'HOLD', 'CLOSE', 'REDUCE', 'INCREASE_SHORT')),
             position_size_pct REAL,
             reasoning TEXT,
-            signals_used TEXT
+            signals_used TEXT,
+            -- analysis / reasoning are '' when the zstd copy below is stored instead
+            analysis_zst BLOB,
+            reasoning_zst BLOB
         );
 
         CREATE TABLE IF NOT EXISTS trades (
@@ -67,7 +132,8 @@ def init_db(conn: sqlite3.Connection):
             order_id TEXT,
             status TEXT DEFAULT 'pending',
             pnl REAL,
-            notes TEXT
+            notes TEXT,
+            notes_zst BLOB  -- notes is '' when this is set
         );
 
         CREATE TABLE IF NOT EXISTS positions (
@@ -95,12 +161,116 @@ def init_db(conn: sqlite3.Connection):
             currency TEXT DEFAULT 'BTC',
             raw_data TEXT
         );
+
+        CREATE TABLE IF NOT EXISTS market_cache (
+            key TEXT PRIMARY KEY,
+            ts REAL NOT NULL,
+            value BLOB
+        );
+
+        CREATE TABLE IF NOT EXISTS agent_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS zstd_dicts (
+            dict_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS cached_insights (
+            key TEXT PRIMARY KEY,
+            insight_json BLOB NOT NULL,
+            ts REAL NOT NULL,
+            direction TEXT
+        );
     """
     )
+    migrate_db(conn)
+    _init_zstd(conn)
     conn.commit()
 
 
-def save_market_snapshot(conn: sqlite3.Connection, data: dict) -> int:
+def _init_zstd(conn: sqlite3.Connection):
+    """Load the stored zstd dictionary, training one first if there's enough prose.
+
+    Doesn't commit: a newly trained dictionary lands with the caller's transaction.
+    """
+    global _zstd_compressor
+    _zstd_compressor = None
+    if zstandard is None:
+        return
+    row = conn.execute("SELECT data FROM zstd_dicts ORDER BY rowid DESC LIMIT 1").fetchone()
+    if row is None:
+        samples = [
+            r[0].encode()
+            for r in conn.execute(
+                """SELECT analysis FROM agent_insights WHERE analysis != ''
+                   UNION ALL SELECT reasoning FROM agent_insights WHERE reasoning != ''
+                   UNION ALL SELECT notes FROM trades WHERE notes != ''
+                   LIMIT ?""",
+                (_ZSTD_MAX_SAMPLES,),
+            )
+        ]
+        if len(samples) < _ZSTD_MIN_SAMPLES:
+            return
+        try:
+            trained = zstandard.train_dictionary(_ZSTD_DICT_SIZE, samples)
+        except zstandard.ZstdError:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO zstd_dicts (dict_id, data) VALUES (?,?)",
+            (trained.dict_id(), trained.as_bytes()),
+        )
+        row = (trained.as_bytes(),)
+    zdict = zstandard.ZstdCompressionDict(row[0])
+    _zstd_dicts[zdict.dict_id()] = zdict
+    _zstd_compressor = zstandard.ZstdCompressor(level=3, dict_data=zdict)
+
+
+def _maybe_train_zstd(conn: sqlite3.Connection):
+    """Retry dictionary training every few saves until there is enough prose,
+    so a long-running process that started below the threshold still switches."""
+    global _zstd_untrained_saves
+    if _zstd_compressor is not None or zstandard is None:
+        return
+    _zstd_untrained_saves += 1
+    if _zstd_untrained_saves >= _ZSTD_RETRAIN_EVERY:
+        _zstd_untrained_saves = 0
+        _init_zstd(conn)
+
+
+def _pack(text: Optional[str]) -> tuple:
+    """``(text, blob)`` to store for a free-text column."""
+    if _zstd_compressor is None or not text:
+        return text, None
+    raw = text.encode()
+    blob = _zstd_compressor.compress(raw)
+    return ("", blob) if len(blob) < len(raw) else (text, None)
+
+
+def _unpack(conn: sqlite3.Connection, blob: bytes) -> str:
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed rows (pip install zstandard)")
+    dict_id = zstandard.get_frame_parameters(blob).dict_id
+    zdict = _zstd_dicts.get(dict_id)
+    if zdict is None:
+        row = conn.execute("SELECT data FROM zstd_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+        zdict = _zstd_dicts[dict_id] = zstandard.ZstdCompressionDict(row[0])
+    return zstandard.ZstdDecompressor(dict_data=zdict).decompress(blob).decode()
+
+
+def _inflate(conn: sqlite3.Connection, table: str, row) -> dict:
+    """Row as a dict with its compressed free-text columns restored."""
+    data = dict(row)
+    for col in _ZSTD_COLUMNS[table]:
+        blob = data.pop(f"{col}_zst", None)
+        if blob is not None:
+            data[col] = _unpack(conn, blob)
+    return data
+
+
+def save_market_snapshot(conn: sqlite3.Connection, data: dict, commit: bool = True) -> int:
     cur = conn.execute(
         """INSERT INTO market_snapshots
            (btc_price, btc_24h_change, btc_volume_24h, eth_price,
@@ -123,40 +293,50 @@ def save_market_snapshot(conn: sqlite3.Connection, data: dict) -> int:
             data.get("dxy_value"),
             data.get("treasury_10y"),
             data.get("fed_rate"),
-            json.dumps(data),
+            _dumps(data),
         ),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
-def save_insight(conn: sqlite3.Connection, data: dict) -> int:
+def save_insight(conn: sqlite3.Connection, data: dict, commit: bool = True) -> int:
+    _maybe_train_zstd(conn)
+    analysis, analysis_zst = _pack(data.get("analysis", ""))
+    reasoning, reasoning_zst = _pack(data.get("reasoning"))
     cur = conn.execute(
         """INSERT INTO agent_insights
            (market_snapshot_id, analysis, sentiment, confidence,
-            recommended_action, position_size_pct, reasoning, signals_used)
-           VALUES (?,?,?,?,?,?,?,?)""",
+            recommended_action, position_size_pct, reasoning, signals_used,
+            analysis_zst, reasoning_zst)
+           VALUES (?,?,?,?,?,?,?,?,?,?)""",
         (
             data.get("market_snapshot_id"),
-            data.get("analysis", ""),
+            analysis,
             data.get("sentiment"),
             data.get("confidence"),
             data.get("recommended_action"),
             data.get("position_size_pct"),
-            data.get("reasoning"),
-            json.dumps(data.get("signals_used", [])),
+            reasoning,
+            _dumps(data.get("signals_used", [])),
+            analysis_zst,
+            reasoning_zst,
         ),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
-def save_trade(conn: sqlite3.Connection, data: dict) -> int:
+def save_trade(conn: sqlite3.Connection, data: dict, commit: bool = True) -> int:
+    _maybe_train_zstd(conn)
+    notes, notes_zst = _pack(data.get("notes"))
     cur = conn.execute(
         """INSERT INTO trades
            (insight_id, instrument, direction, amount, price,
-            order_type, order_id, status, notes)
-           VALUES (?,?,?,?,?,?,?,?,?)""",
+            order_type, order_id, status, notes, notes_zst)
+           VALUES (?,?,?,?,?,?,?,?,?,?)""",
         (
             data.get("insight_id"),
             data["instrument"],
@@ -166,14 +346,16 @@ def save_trade(conn: sqlite3.Connection, data: dict) -> int:
             data.get("order_type", "market"),
             data.get("order_id"),
             data.get("status", "pending"),
-            data.get("notes"),
+            notes,
+            notes_zst,
         ),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
-def save_position_snapshot(conn: sqlite3.Connection, data: dict) -> int:
+def save_position_snapshot(conn: sqlite3.Connection, data: dict, commit: bool = True) -> int:
     cur = conn.execute(
         """INSERT INTO positions
            (instrument, direction, size, avg_entry_price, mark_price,
@@ -188,14 +370,15 @@ def save_position_snapshot(conn: sqlite3.Connection, data: dict) -> int:
             data.get("liquidation_price"),
             data.get("unrealized_pnl"),
             data.get("realized_pnl"),
-            json.dumps(data),
+            _dumps(data),
         ),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
-def save_account_snapshot(conn: sqlite3.Connection, data: dict) -> int:
+def save_account_snapshot(conn: sqlite3.Connection, data: dict, commit: bool = True) -> int:
     cur = conn.execute(
         """INSERT INTO account_snapshots
            (equity, balance, margin_used, available_margin, total_pnl, currency, raw_data)
@@ -207,10 +390,11 @@ def save_account_snapshot(conn: sqlite3.Connection, data: dict) -> int:
             data.get("available_margin"),
             data.get("total_pnl"),
             data.get("currency", "BTC"),
-            json.dumps(data),
+            _dumps(data),
         ),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
@@ -218,14 +402,14 @@ def get_recent_insights(conn: sqlite3.Connection, limit: int = 10) -> list[dict]
     rows = conn.execute(
         "SELECT * FROM agent_insights ORDER BY id DESC LIMIT ?", (limit,)
     ).fetchall()
-    return [dict(r) for r in rows]
+    return [_inflate(conn, "agent_insights", r) for r in rows]
 
 
 def get_recent_trades(conn: sqlite3.Connection, limit: int = 20) -> list[dict]:
     rows = conn.execute(
         "SELECT * FROM trades ORDER BY id DESC LIMIT ?", (limit,)
     ).fetchall()
-    return [dict(r) for r in rows]
+    return [_inflate(conn, "trades", r) for r in rows]
 
 
 def get_recent_snapshots(conn: sqlite3.Connection, limit: int = 50) -> list[dict]:
@@ -235,6 +419,72 @@ def get_recent_snapshots(conn: sqlite3.Connection, limit: int = 50) -> list[dict
     return [dict(r) for r in rows]
 
 
+def load_market_cache(conn: sqlite3.Connection) -> dict:
+    """Return persisted market-data cache entries as ``{key: (ts, value)}``."""
+    rows = conn.execute("SELECT key, ts, value FROM market_cache").fetchall()
+    return {r["key"]: (r["ts"], _loads(r["value"])) for r in rows}
+
+
+def save_market_cache(conn: sqlite3.Connection, entries: dict, commit: bool = True):
+    """Upsert ``{key: (ts, value)}`` cache entries."""
+    if not entries:
+        return
+    conn.executemany(
+        "INSERT OR REPLACE INTO market_cache (key, ts, value) VALUES (?,?,?)",
+        [(key, ts, _dumps(value)) for key, (ts, value) in entries.items()],
+    )
+    if commit:
+        conn.commit()
+
+
+def get_state(conn: sqlite3.Connection, key: str, default=None):
+    """A JSON value the agent persisted under key, or default."""
+    row = conn.execute("SELECT value FROM agent_state WHERE key = ?", (key,)).fetchone()
+    return _loads(row["value"]) if row else default
+
+
+def set_state(conn: sqlite3.Connection, key: str, value, commit: bool = True):
+    conn.execute(
+        "INSERT OR REPLACE INTO agent_state (key, value) VALUES (?,?)", (key, _dumps(value))
+    )
+    if commit:
+        conn.commit()
+
+
+def get_cached_insight(
+    conn: sqlite3.Connection, key: str, max_age: float, direction: Optional[str]
+) -> Optional[tuple[float, dict]]:
+    """Return ``(ts, insight)`` cached under key if younger than max_age seconds
+    and recorded with the same position direction, else None."""
+    row = conn.execute(
+        "SELECT ts, insight_json, direction FROM cached_insights WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None or row["direction"] != direction:
+        return None
+    if datetime.now(timezone.utc).timestamp() - row["ts"] > max_age:
+        return None
+    return row["ts"], _loads(row["insight_json"])
+
+
+def save_cached_insight(
+    conn: sqlite3.Connection,
+    key: str,
+    insight: dict,
+    direction: Optional[str],
+    max_age: float,
+    commit: bool = True,
+):
+    """Cache insight under key, dropping entries too old for get_cached_insight to return."""
+    now = datetime.now(timezone.utc).timestamp()
+    conn.execute("DELETE FROM cached_insights WHERE ts < ?", (now - max_age,))
+    conn.execute(
+        "INSERT OR REPLACE INTO cached_insights (key, insight_json, ts, direction) VALUES (?,?,?,?)",
+        (key, _dumps(insight), now, direction),
+    )
+    if commit:
+        conn.commit()
+
+
 def get_latest_position(conn: sqlite3.Connection) -> Optional[dict]:
     row = conn.execute(
         "SELECT * FROM positions ORDER BY id DESC LIMIT 1"
@@ -247,3 +497,88 @@ def get_latest_account(conn: sqlite3.Connection) -> Optional[dict]:
         "SELECT * FROM account_snapshots ORDER BY id DESC LIMIT 1"
     ).fetchone()
     return dict(row) if row else None
+
+
+def get_context_at(conn: sqlite3.Connection, snapshot: dict, window: int = 300) -> tuple:
+    """``(account, position, insights)`` as the cycle that stored snapshot saw them.
+
+    Account and position are the first rows saved within window seconds after
+    the snapshot; a cycle only saves a position while one is open, so a
+    missing position means flat (``{}``). Insights are the three decided
+    before it, newest first.
+    """
+    start = snapshot["ts"]
+    end = (datetime.strptime(start, "%Y-%m-%dT%H:%M:%SZ") + timedelta(seconds=window)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    account = conn.execute(
+        "SELECT * FROM account_snapshots WHERE ts >= ? AND ts <= ? ORDER BY id LIMIT 1", (start, end)
+    ).fetchone()
+    position = conn.execute(
+        "SELECT * FROM positions WHERE ts >= ? AND ts <= ? ORDER BY id LIMIT 1", (start, end)
+    ).fetchone()
+    insights = conn.execute(
+        "SELECT * FROM agent_insights WHERE market_snapshot_id < ? ORDER BY id DESC LIMIT 3",
+        (snapshot["id"],),
+    ).fetchall()
+    return (
+        dict(account) if account else {},
+        dict(position) if position else {},
+        [_inflate(conn, "agent_insights", r) for r in insights],
+    )
+
+
+# Read-only projections of the rows the report's loops display; plain tuple
+# attributes resolve faster in Jinja than sqlite3.Row/dict item lookups.
+InsightRow = namedtuple("InsightRow", "id ts recommended_action sentiment confidence analysis")
+TradeRow = namedtuple("TradeRow", "id ts instrument direction amount status notes")
+
+
+def fetch_report_bundle(
+    conn: sqlite3.Connection,
+    insights_limit: int = 8,
+    trades_limit: int = 15,
+    snapshots_limit: int = 1,
+    include_position: bool = True,
+    include_account: bool = True,
+) -> dict:
+    """Fetch everything the report needs in one read transaction on one cursor.
+
+    Returns a dict with ``insights`` (list of InsightRow), ``latest_insight``
+    (the newest insight as a full dict, or None), ``trades`` (list of TradeRow),
+    ``snapshots`` (list of dicts) and ``position`` / ``account`` (dict or None).
+    A ``snapshots_limit`` of 0 or a false ``include_*`` flag skips that query
+    (the result is then empty / None) for callers that already have the data.
+    """
+    cur = conn.cursor()
+    own_txn = not conn.in_transaction
+    if own_txn:
+        cur.execute("BEGIN")
+    try:
+        insights = cur.execute(
+            "SELECT * FROM agent_insights ORDER BY id DESC LIMIT ?", (insights_limit,)
+        ).fetchall()
+        trades = cur.execute(
+            f"SELECT {', '.join(TradeRow._fields)}, notes_zst FROM trades ORDER BY id DESC LIMIT ?",
+            (trades_limit,),
+        ).fetchall()
+        snapshots = cur.execute(
+            "SELECT * FROM market_snapshots ORDER BY id DESC LIMIT ?", (snapshots_limit,)
+        ).fetchall() if snapshots_limit else []
+        position = cur.execute(
+            "SELECT * FROM positions ORDER BY id DESC LIMIT 1"
+        ).fetchone() if include_position else None
+        account = cur.execute(
+            "SELECT * FROM account_snapshots ORDER BY id DESC LIMIT 1"
+        ).fetchone() if include_account else None
+    finally:
+        if own_txn:
+            conn.commit()
+    insights = [_inflate(conn, "agent_insights", r) for r in insights]
+    trades = [_inflate(conn, "trades", r) for r in trades]
+    return {
+        "insights": [InsightRow._make(r[f] for f in InsightRow._fields) for r in insights],
+        "latest_insight": insights[0] if insights else None,
+        "trades": [TradeRow._make(r.values()) for r in trades],
+        "snapshots": [dict(r) for r in snapshots],
+        "position": dict(position) if position else None,
+        "account": dict(account) if account else None,
+    }
@@ -1,12 +1,34 @@
-"""Deribit REST API client for trading BTC perpetual futures and options."""
+"""Deribit REST and WebSocket clients for trading BTC perpetual futures and options."""
 
+import asyncio
+import json
+import socket
+import threading
 import time
 import requests
+import websockets
+from requests.adapters import HTTPAdapter
 from typing import Optional
+from urllib3.connection import HTTPConnection
 
 from .config import Config
 
 
+# TCP keepalive probes keep the pooled connection (and any NAT/LB state in
+# front of it) alive through the idle minutes between agent cycles.
+_KEEPALIVE_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 30), ("TCP_KEEPCNT", 4))
+    if hasattr(socket, name)
+]
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + _KEEPALIVE_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
 class DeribitClient:
     def __init__(self):
         self.base_url = Config.DERIBIT_BASE_URL
@@ -14,7 +36,9 @@ class DeribitClient:
         self.client_secret = Config.DERIBIT_CLIENT_SECRET
         self.access_token: Optional[str] = None
         self.token_expiry: float = 0
+        self._auth_lock = threading.Lock()  # callers may fetch from several threads
         self.session = requests.Session()
+        self.session.mount("https://", _KeepAliveAdapter())
         self.is_live = Config.DERIBIT_LIVE
 
     def _request(self, method: str, params: Optional[dict] = None) -> dict:
@@ -45,16 +69,19 @@ class DeribitClient:
         """Authenticate or refresh token if expired."""
         if self.access_token and time.time() < self.token_expiry - 30:
             return
-        result = self._request(
-            "public/auth",
-            {
-                "grant_type": "client_credentials",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-            },
-        )
-        self.access_token = result["access_token"]
-        self.token_expiry = time.time() + result["expires_in"]
+        with self._auth_lock:
+            if self.access_token and time.time() < self.token_expiry - 30:
+                return  # another thread refreshed it while we waited
+            result = self._request(
+                "public/auth",
+                {
+                    "grant_type": "client_credentials",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                },
+            )
+            self.access_token = result["access_token"]
+            self.token_expiry = time.time() + result["expires_in"]
 
     # ---- Public Market Data (no auth needed) ----
 
@@ -183,3 +210,150 @@ class DeribitClient:
             "private/get_user_trades_by_instrument",
             {"instrument_name": instrument, "count": count, "sorting": "desc"},
         )
+
+
+class DeribitWSClient:
+    """Keeps the latest account and position pushed over Deribit's WebSocket API.
+
+    Runs its own event loop on a daemon thread. Each session authenticates,
+    subscribes to the BTC portfolio and BTC-PERPETUAL change channels, then
+    seeds both values once with private/get_* calls, since user.changes only
+    pushes on fills. Pushes keep them current after that, and the access token
+    is refreshed before it expires. Reads return None while the socket is
+    down or silent for too long; callers fall back to REST then.
+    """
+
+    HEARTBEAT_SECS = 30
+    CALL_TIMEOUT = 15
+
+    def __init__(self, instrument: str = "BTC-PERPETUAL"):
+        self.url = Config.DERIBIT_WS_URL
+        self.client_id = Config.DERIBIT_CLIENT_ID
+        self.client_secret = Config.DERIBIT_CLIENT_SECRET
+        self.instrument = instrument
+        self.channels = ["user.portfolio.btc", f"user.changes.{instrument}.raw"]
+        self._latest: dict = {}  # "account" / "position" -> payload, for the current session
+        self._last_seen = 0.0  # monotonic time of the last message received
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._next_id = 0
+        self._pending: dict = {}  # request id -> Future for its response
+
+    def start(self):
+        """Start streaming in the background (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=lambda: asyncio.run(self._run()), name="deribit-ws", daemon=True
+            )
+            self._thread.start()
+
+    def account(self, max_age: float = 2.5 * HEARTBEAT_SECS) -> Optional[dict]:
+        """Latest account summary, or None if the socket hasn't been heard from
+        within max_age seconds (heartbeats arrive every HEARTBEAT_SECS)."""
+        return self._current("account", max_age)
+
+    def position(self, max_age: float = 2.5 * HEARTBEAT_SECS) -> Optional[dict]:
+        """Latest position, or None if the socket hasn't been heard from within
+        max_age seconds."""
+        return self._current("position", max_age)
+
+    def _current(self, key: str, max_age: float) -> Optional[dict]:
+        with self._lock:
+            payload = self._latest.get(key)
+            alive = time.monotonic() - self._last_seen <= max_age
+        return payload if alive else None
+
+    def _store(self, key: str, payload: dict):
+        with self._lock:
+            self._latest[key] = payload
+
+    async def _run(self):
+        """Connect, stream, and reconnect with backoff for the life of the process."""
+        delay = 1
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    await self._session(ws)
+            except Exception as e:
+                print(f"  [warn] Deribit WebSocket dropped: {e}")
+            else:
+                delay = 1
+            with self._lock:
+                self._latest.clear()  # a new session re-seeds; don't serve the old state
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def _call(self, ws, method: str, params: Optional[dict] = None):
+        """Send a JSON-RPC request and wait for _read to hand back its response."""
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}))
+        try:
+            return await asyncio.wait_for(future, self.CALL_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _session(self, ws):
+        reader = asyncio.create_task(self._read(ws))
+        try:
+            auth = await self._call(ws, "public/auth", {
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            })
+            await self._call(ws, "public/set_heartbeat", {"interval": self.HEARTBEAT_SECS})
+            await self._call(ws, "private/subscribe", {"channels": self.channels})
+            # Requested after subscribing, so any push that beats the reply is older
+            position, account = await asyncio.gather(
+                self._call(ws, "private/get_position", {"instrument_name": self.instrument}),
+                self._call(ws, "private/get_account_summary", {"currency": "BTC"}),
+            )
+            self._store("position", position)
+            self._store("account", account)
+
+            while True:
+                done, _ = await asyncio.wait({reader}, timeout=auth["expires_in"] * 0.8)
+                if done:
+                    return reader.result()
+                auth = await self._call(ws, "public/auth", {
+                    "grant_type": "refresh_token",
+                    "refresh_token": auth["refresh_token"],
+                })
+        finally:
+            reader.cancel()
+
+    async def _read(self, ws):
+        """Route every incoming message: responses to their _call, pushes to state."""
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                with self._lock:
+                    self._last_seen = time.monotonic()
+                future = self._pending.get(msg.get("id"))
+                if future is not None:
+                    if future.done():
+                        pass  # its _call already timed out
+                    elif "error" in msg:
+                        future.set_exception(Exception(f"Deribit API error: {msg['error']}"))
+                    else:
+                        future.set_result(msg.get("result"))
+                    continue
+                method = msg.get("method")
+                if method == "subscription":
+                    self._on_update(msg["params"]["channel"], msg["params"]["data"])
+                elif method == "heartbeat" and msg["params"].get("type") == "test_request":
+                    await ws.send(json.dumps({"jsonrpc": "2.0", "method": "public/test", "params": {}}))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Deribit WebSocket closed"))
+
+    def _on_update(self, channel: str, data: dict):
+        if channel.startswith("user.portfolio."):
+            self._store("account", data)
+        elif channel.startswith("user.changes."):
+            for pos in data.get("positions", []):
+                if pos.get("instrument_name") == self.instrument:
+                    self._store("position", pos)
@@ -1,40 +1,224 @@
 """Aggregate market data from free public APIs to feed the AI trading agent."""
 
+import copy
+import math
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
+from functools import partial
+
 import requests
-import pandas as pd
-import numpy as np
 from typing import Optional
 
 from .config import Config
 from .deribit_client import DeribitClient
 
+# How long (seconds) each source's last value stays fresh. Fast-moving prices
+# are re-pulled almost every time; daily macro series are not.
+_TTLS = {
+    "crypto_prices": 30,
+    "deribit_data": 60,
+    "fear_greed": 1800,
+    "gold_price": 3600,
+    "dxy_value": 3600,
+    "treasury_10y": 3600,
+    "vix": 3600,
+    "fed_rate": 86400,
+}
+
+_FRED_SERIES = {
+    "gold_price": "GOLDAMGBD228NLBM",
+    "dxy_value": "DTWEXBGS",
+    "treasury_10y": "DGS10",
+    "fed_rate": "DFF",
+    "vix": "VIXCLS",
+}
+
+# Deadline (seconds) for a whole collection. The per-request HTTP timeouts
+# don't bound a source that makes several calls (a technicals rebuild pages
+# through history), and a source still running past this is left out.
+_COLLECT_TIMEOUT = 30
+
+_HOUR_MS = 3600 * 1000
+_TA_HISTORY_BARS = 200  # enough 1h bars for EMA(50) to settle on a rebuild
+_TA_MAX_GAP_BARS = 14
+
+_DEQUE_FIELDS = {"gains": 14, "losses": 14, "true_ranges": 14, "closes": 20}
+
+
+@dataclass
+class TAState:
+    """Running state of the 1h indicators, advanced one closed bar at a time.
+
+    EMAs (12/26/50, MACD signal) are recursive; RSI, ATR and Bollinger keep
+    just the window of values their rolling means/stdev need. Same formulas
+    as a full pandas pass over the bars (simple-mean RSI/ATR, adjust=False
+    EMAs seeded with the first value), without rescanning history.
+    """
+
+    last_tick: int = 0  # open time (ms) of the newest bar folded in
+    bars: int = 0
+    prev_close: Optional[float] = None
+    ema12: Optional[float] = None
+    ema26: Optional[float] = None
+    ema50: Optional[float] = None
+    macd_signal: Optional[float] = None
+    gains: deque = field(default_factory=lambda: deque(maxlen=14))
+    losses: deque = field(default_factory=lambda: deque(maxlen=14))
+    true_ranges: deque = field(default_factory=lambda: deque(maxlen=14))
+    closes: deque = field(default_factory=lambda: deque(maxlen=20))
+
+    @staticmethod
+    def _ema(prev: Optional[float], value: float, span: int) -> float:
+        if prev is None:
+            return value
+        alpha = 2 / (span + 1)
+        return alpha * value + (1 - alpha) * prev
+
+    def push(self, tick: int, high: float, low: float, close: float):
+        """Fold one bar into the state."""
+        if self.prev_close is None:
+            delta = 0.0
+            true_range = high - low
+        else:
+            delta = close - self.prev_close
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.gains.append(delta if delta > 0 else 0.0)
+        self.losses.append(-delta if delta < 0 else 0.0)
+        self.true_ranges.append(true_range)
+        self.closes.append(close)
+
+        self.ema12 = self._ema(self.ema12, close, 12)
+        self.ema26 = self._ema(self.ema26, close, 26)
+        self.ema50 = self._ema(self.ema50, close, 50)
+        self.macd_signal = self._ema(self.macd_signal, self.ema12 - self.ema26, 9)
+
+        self.prev_close = close
+        self.last_tick = tick
+        self.bars += 1
+
+    def indicators(self) -> dict:
+        """The snapshot's indicator fields as of the newest bar."""
+        if self.bars < 26:
+            return {}
+        result = {}
+
+        # RSI(14)
+        avg_loss = sum(self.losses) / 14
+        if avg_loss:
+            rs = (sum(self.gains) / 14) / avg_loss
+            result["rsi_14"] = round(100 - (100 / (1 + rs)), 4)
+
+        # MACD(12, 26, 9)
+        macd_line = self.ema12 - self.ema26
+        result["macd"] = round(macd_line, 2)
+        result["macd_signal"] = round(self.macd_signal, 2)
+        result["macd_histogram"] = round(macd_line - self.macd_signal, 2)
+
+        # Bollinger Bands(20, 2)
+        bb_mid = sum(self.closes) / 20
+        bb_std = math.sqrt(sum((c - bb_mid) ** 2 for c in self.closes) / 19)
+        result["bb_middle"] = round(bb_mid, 4)
+        result["bb_upper"] = round(bb_mid + 2 * bb_std, 4)
+        result["bb_lower"] = round(bb_mid - 2 * bb_std, 4)
+        bb_range = result["bb_upper"] - result["bb_lower"]
+        if bb_range > 0:
+            result["bb_position"] = round((self.prev_close - result["bb_lower"]) / bb_range, 4)
+
+        # EMA(50)
+        if self.bars >= 50:
+            result["ema_50"] = round(self.ema50, 4)
+
+        # ATR(14)
+        result["atr_14"] = round(sum(self.true_ranges) / 14, 4)
+
+        return result
+
+    def to_dict(self) -> dict:
+        return {f.name: list(v) if isinstance(v := getattr(self, f.name), deque) else v for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TAState":
+        state = cls(**{k: v for k, v in data.items() if k not in _DEQUE_FIELDS})
+        for name, maxlen in _DEQUE_FIELDS.items():
+            setattr(state, name, deque(data.get(name, ()), maxlen=maxlen))
+        return state
+
 
 class MarketDataCollector:
     """Pulls data from CoinGecko, Alternative.me, FRED, Deribit, and CryptoCompare."""
 
-    def __init__(self, deribit: DeribitClient):
+    def __init__(self, deribit: DeribitClient, cache: Optional[dict] = None):
         self.deribit = deribit
         self.session = requests.Session()
         self.session.headers.update({"Accept": "application/json"})
+        # {key: (fetched_at, value)}; wall-clock so persisted entries stay valid across runs
+        self._ttl_cache: dict = dict(cache or {})
+        self._dirty: set = set()
+        # Persisted alongside the TTL entries (under "ta_state"), outside _TTLS
+        saved_ta = self._ttl_cache.get("ta_state")
+        self._ta_state: Optional[TAState] = TAState.from_dict(saved_ta[1]) if saved_ta else None
+        # Sources are independent blocking GETs; overlap their round-trips
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="market-data")
+
+    def _cached(self, key: str, fn, margin: float = 0.0):
+        """Return the cached value for key while fresh, else call fn and cache it.
+
+        margin treats entries expiring within that many seconds as already stale.
+        """
+        now = time.time()
+        hit = self._ttl_cache.get(key)
+        if hit is not None and now - hit[0] < _TTLS[key] - margin:
+            return hit[1]
+        value = fn()
+        self._ttl_cache[key] = (now, value)
+        self._dirty.add(key)
+        return value
+
+    def pop_cache_updates(self) -> dict:
+        """Return (and forget) the cache entries refreshed since the last call."""
+        updates = {key: self._ttl_cache[key] for key in self._dirty}
+        self._dirty.clear()
+        return updates
+
+    def prewarm(self, lead: float):
+        """Refresh cached sentiment/macro values that would expire within lead seconds."""
+        try:
+            self._cached("fear_greed", self._get_fear_greed, margin=lead)
+        except Exception as e:
+            print(f"  [warn] Failed to prewarm fear_greed: {e}")
+        self._get_macro_data(margin=lead)  # per-series failures are already swallowed
 
     def collect_all(self) -> dict:
         """Collect a full market snapshot from all available sources."""
         snapshot = {}
 
-        # Each call is wrapped in try/except so one failure doesn't kill the whole snapshot
         collectors = [
-            ("crypto_prices", self._get_crypto_prices),
-            ("fear_greed", self._get_fear_greed),
-            ("deribit_data", self._get_deribit_data),
-            ("macro_data", self._get_macro_data),
-            ("technicals", self._get_technicals),
+            ("crypto_prices", partial(self._cached, "crypto_prices", self._get_crypto_prices)),
+            ("fear_greed", partial(self._cached, "fear_greed", self._get_fear_greed)),
+            ("deribit_data", partial(self._cached, "deribit_data", self._get_deribit_data)),
         ]
-
-        for name, fn in collectors:
+        if Config.FRED_API_KEY:
+            # One task per series so the FRED round-trips overlap too
+            collectors += [
+                (field, partial(self._get_macro_field, field, series_id))
+                for field, series_id in _FRED_SERIES.items()
+            ]
+        collectors.append(("technicals", self._get_technicals))
+
+        futures = [(name, self._pool.submit(fn)) for name, fn in collectors]
+        wait([future for _, future in futures], timeout=_COLLECT_TIMEOUT)
+
+        # Merge in submission order so the snapshot's key order is stable.
+        # Each result is wrapped in try/except so one failure doesn't kill the whole snapshot
+        for name, future in futures:
+            if not future.done():
+                future.cancel()
+                print(f"  [warn] Skipped {name}: no result within {_COLLECT_TIMEOUT}s")
+                continue
             try:
-                result = fn()
-                snapshot.update(result)
+                snapshot.update(future.result())
             except Exception as e:
                 print(f"  [warn] Failed to collect {name}: {e}")
 
@@ -110,123 +294,85 @@ class MarketDataCollector:
 
         return result
 
-    def _get_macro_data(self) -> dict:
+    def _get_macro_data(self, margin: float = 0.0) -> dict:
         """Macro indicators from FRED (requires free API key)."""
         if not Config.FRED_API_KEY:
             return {}
 
         result = {}
-        series_map = {
-            "gold_price": "GOLDAMGBD228NLBM",
-            "dxy_value": "DTWEXBGS",
-            "treasury_10y": "DGS10",
-            "fed_rate": "DFF",
-            "vix": "VIXCLS",
-        }
+        for field, series_id in _FRED_SERIES.items():
+            result.update(self._get_macro_field(field, series_id, margin))
+        return result
 
-        for field, series_id in series_map.items():
-            try:
-                resp = self.session.get(
-                    "https://api.stlouisfed.org/fred/series/observations",
-                    params={
-                        "series_id": series_id,
-                        "api_key": Config.FRED_API_KEY,
-                        "file_type": "json",
-                        "sort_order": "desc",
-                        "limit": 1,
-                    },
-                    timeout=10,
-                )
-                resp.raise_for_status()
-                obs = resp.json().get("observations", [])
-                if obs and obs[0].get("value") != ".":
-                    result[field] = float(obs[0]["value"])
-            except Exception:
-                pass
+    def _get_macro_field(self, field: str, series_id: str, margin: float = 0.0) -> dict:
+        """``{field: value}`` for one cached FRED series; empty if missing or failed."""
+        try:
+            value = self._cached(field, lambda: self._get_fred_series(series_id), margin)
+        except Exception:
+            return {}
+        return {field: value} if value is not None else {}
 
-        return result
+    def _get_fred_series(self, series_id: str) -> Optional[float]:
+        """Latest observation of one FRED series, or None if it is missing."""
+        resp = self.session.get(
+            "https://api.stlouisfed.org/fred/series/observations",
+            params={
+                "series_id": series_id,
+                "api_key": Config.FRED_API_KEY,
+                "file_type": "json",
+                "sort_order": "desc",
+                "limit": 1,
+            },
+            timeout=10,
+        )
+        resp.raise_for_status()
+        obs = resp.json().get("observations", [])
+        if obs and obs[0].get("value") != ".":
+            return float(obs[0]["value"])
+        return None
 
     def _get_technicals(self) -> dict:
-        """Compute technical indicators from Deribit OHLCV data using pure pandas."""
+        """Technical indicators on 1h Deribit candles, advanced incrementally.
+
+        Only bars closed since the last cycle are fetched and folded into the
+        running TAState; the still-forming bar is applied to a throwaway copy.
+        The state is rebuilt from _TA_HISTORY_BARS of history on first use or
+        after a gap of more than _TA_MAX_GAP_BARS.
+        """
         try:
+            now_ms = int(time.time() * 1000)
+            state = self._ta_state
+            if state is None or now_ms - state.last_tick > _TA_MAX_GAP_BARS * _HOUR_MS:
+                state = TAState()
+                start_ms = now_ms - _TA_HISTORY_BARS * _HOUR_MS
+            else:
+                start_ms = state.last_tick + _HOUR_MS
+
             chart = self.deribit.get_chart_data(
                 instrument="BTC-PERPETUAL",
                 resolution="60",  # 1h candles
+                start_ms=start_ms,
+                end_ms=now_ms,
             )
 
-            if not chart or "close" not in chart:
-                return {}
-
-            df = pd.DataFrame(
-                {
-                    "open": chart["open"],
-                    "high": chart["high"],
-                    "low": chart["low"],
-                    "close": chart["close"],
-                    "volume": chart["volume"],
-                }
-            )
-
-            if len(df) < 26:
-                return {}
-
-            close = df["close"]
-            high = df["high"]
-            low = df["low"]
-            result = {}
-
-            # RSI(14)
-            delta = close.diff()
-            gain = delta.where(delta > 0, 0.0).rolling(14).mean()
-            loss = (-delta.where(delta < 0, 0.0)).rolling(14).mean()
-            rs = gain / loss.replace(0, np.nan)
-            rsi = 100 - (100 / (1 + rs))
-            if pd.notna(rsi.iloc[-1]):
-                result["rsi_14"] = round(float(rsi.iloc[-1]), 4)
-
-            # MACD(12, 26, 9)
-            ema12 = close.ewm(span=12, adjust=False).mean()
-            ema26 = close.ewm(span=26, adjust=False).mean()
-            macd_line = ema12 - ema26
-            signal_line = macd_line.ewm(span=9, adjust=False).mean()
-            histogram = macd_line - signal_line
-            if pd.notna(macd_line.iloc[-1]):
-                result["macd"] = round(float(macd_line.iloc[-1]), 2)
-                result["macd_signal"] = round(float(signal_line.iloc[-1]), 2)
-                result["macd_histogram"] = round(float(histogram.iloc[-1]), 2)
-
-            # Bollinger Bands(20, 2)
-            bb_mid = close.rolling(20).mean()
-            bb_std = close.rolling(20).std()
-            bb_upper = bb_mid + 2 * bb_std
-            bb_lower = bb_mid - 2 * bb_std
-            if pd.notna(bb_mid.iloc[-1]):
-                result["bb_middle"] = round(float(bb_mid.iloc[-1]), 4)
-                result["bb_upper"] = round(float(bb_upper.iloc[-1]), 4)
-                result["bb_lower"] = round(float(bb_lower.iloc[-1]), 4)
-                bb_range = result["bb_upper"] - result["bb_lower"]
-                if bb_range > 0:
-                    result["bb_position"] = round(
-                        (float(close.iloc[-1]) - result["bb_lower"]) / bb_range, 4
-                    )
-
-            # EMA(50)
-            if len(df) >= 50:
-                ema50 = close.ewm(span=50, adjust=False).mean()
-                if pd.notna(ema50.iloc[-1]):
-                    result["ema_50"] = round(float(ema50.iloc[-1]), 4)
-
-            # ATR(14)
-            tr = pd.concat([
-                high - low,
-                (high - close.shift()).abs(),
-                (low - close.shift()).abs(),
-            ], axis=1).max(axis=1)
-            atr = tr.rolling(14).mean()
-            if pd.notna(atr.iloc[-1]):
-                result["atr_14"] = round(float(atr.iloc[-1]), 4)
-
-            return result
+            forming = None
+            if chart and "close" in chart:
+                for bar in zip(chart["ticks"], chart["high"], chart["low"], chart["close"]):
+                    if state.bars and bar[0] <= state.last_tick:
+                        continue
+                    if bar[0] + _HOUR_MS > now_ms:
+                        forming = bar
+                    else:
+                        state.push(*bar)
+
+            self._ta_state = state
+            self._ttl_cache["ta_state"] = (time.time(), state.to_dict())
+            self._dirty.add("ta_state")
+
+            if forming is not None:
+                state = copy.deepcopy(state)
+                state.push(*forming)
+            return state.indicators()
 
         except Exception as e:
             print(f"  [warn] Technical analysis failed: {e}")
@@ -5,12 +5,31 @@ on Deribit, guided by the thesis that Bitcoin is fundamentally overvalued
 and headed toward zero.
 """
 
+import hashlib
 import json
+import math
+import re
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Optional
 
 import anthropic
+import httpx
+import jsonschema
+from jinja2 import BaseLoader, Environment
+
+try:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the guard below holds
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    import json5  # lenient parser for near-JSON replies (trailing commas, comments, ...)
+except ImportError:
+    json5 = None
 
 from .config import Config
 from .database import (
@@ -26,8 +45,15 @@ from .database import (
     get_recent_snapshots,
     get_latest_position,
     get_latest_account,
+    load_market_cache,
+    save_market_cache,
+    get_cached_insight,
+    save_cached_insight,
+    get_state,
+    set_state,
+    get_context_at,
 )
-from .deribit_client import DeribitClient
+from .deribit_client import DeribitClient, DeribitWSClient
 from .market_data import MarketDataCollector
 
 SYSTEM_PROMPT = """You are an elite quantitative trading analyst operating a BTC short-selling strategy on Deribit.
@@ -71,52 +97,425 @@ Respond with a JSON object (and nothing else) with exactly these fields:
 If there's no position and the signal isn't strong enough, use HOLD with position_size_pct: 0."""
 
 
+# One long-lived HTTP/2 connection to the API, kept open across the idle gap
+# between cycles so each cycle skips the TCP+TLS handshake.
+_HTTP_LIMITS = httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=3600.0)
+_HTTP_TIMEOUT = httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0)
+
+# max_tokens tracks an EMA of observed reply length (x1.3 headroom), clamped
+# to this range; the decision object is ~250 tokens.
+MIN_TOKENS = 256
+MAX_TOKENS = 1024
+_TOKENS_EMA_KEY = "output_tokens_ema"
+# Added to an early-stopped reply's estimate for the closing fence it never sent
+_EARLY_STOP_MARGIN = 8
+
+
+def should_escalate(snapshot: dict, prev_snapshot: Optional[dict], position: dict, account: dict) -> bool:
+    """Whether this cycle looks like a regime change that deserves the deep model.
+
+    True on a >3% 24h move, a Fear & Greed cross of the 25/75 bands, a funding
+    sign flip, or unrealized PnL beyond ±5% of equity. With no previous
+    snapshot to compare against (first cycle), escalate.
+    """
+    if prev_snapshot is None:
+        return True
+    if abs(snapshot.get("btc_24h_change") or 0) > 3:
+        return True
+
+    fg, prev_fg = snapshot.get("fear_greed_index"), prev_snapshot.get("fear_greed_index")
+    if fg is not None and prev_fg is not None:
+        if (fg <= 25) != (prev_fg <= 25) or (fg >= 75) != (prev_fg >= 75):
+            return True
+
+    funding, prev_funding = snapshot.get("funding_rate"), prev_snapshot.get("funding_rate")
+    if funding is not None and prev_funding is not None and funding * prev_funding < 0:
+        return True
+
+    equity = account.get("equity")
+    pnl = position.get("unrealized_pnl")
+    if equity and pnl is not None and abs(pnl / equity) > 0.05:
+        return True
+    return False
+
+# A fenced ```json block anywhere in the reply, else the outermost {...} span
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL | re.IGNORECASE)
+_JSON_OBJ = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def _extract_json(text: str) -> Optional[dict]:
+    """Pull the decision object out of a model reply, or None if there isn't one."""
+    fenced = _JSON_FENCE.search(text)
+    match = fenced or _JSON_OBJ.search(text)
+    if not match:
+        return None
+    candidate = match.group(1 if fenced else 0)
+    try:
+        obj = _json_loads(candidate)
+    except json.JSONDecodeError:
+        if json5 is None:
+            return None
+        try:
+            obj = json5.loads(candidate)
+        except ValueError:
+            return None
+    return obj if isinstance(obj, dict) else None
+
+
+# Snapshot fields the prompt shows. When none of them moved materially since a
+# recent cycle and the position is exactly the same, that cycle's decision is
+# reused instead of asking Claude again (and is not executed a second time).
+DECISION_KEYS = (
+    "btc_price", "btc_24h_change", "eth_price", "deribit_btc_index",
+    "deribit_mark_price", "funding_rate", "open_interest", "deribit_volatility",
+    "fear_greed_index", "fear_greed_label",
+    "gold_price", "dxy_value", "treasury_10y", "fed_rate", "vix",
+    "rsi_14", "macd", "macd_signal", "macd_histogram", "bb_position", "ema_50", "atr_14",
+)
+_PRICE_KEYS = frozenset({
+    "btc_price", "eth_price", "deribit_btc_index", "deribit_mark_price",
+    "open_interest", "gold_price", "ema_50", "atr_14",
+})
+_PRICE_BUCKET = math.log1p(0.0025)  # prices hash in 0.25% buckets
+INSIGHT_REUSE_SECS = 3600
+
+
+def round_for_hash(key: str, value):
+    """Coarsen a snapshot value so insignificant moves hash the same."""
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return value
+    if key in _PRICE_KEYS:
+        return round(math.log(value) / _PRICE_BUCKET) if value > 0 else 0
+    if key == "rsi_14":
+        return round(value)
+    return float(f"{value:.3g}")
+
+
+def snapshot_fingerprint(snapshot: dict, position: dict) -> str:
+    """Short hash of the decision-relevant, rounded slice of a snapshot plus the
+    current position's side and size (any fill changes the key)."""
+    fields = {k: round_for_hash(k, snapshot.get(k)) for k in DECISION_KEYS}
+    fields["position"] = [position.get("direction"), position.get("size")]
+    payload = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _row(row_id: int, data: dict, **overrides) -> dict:
+    """A just-inserted row as the DB would return it (id and default ts filled in)."""
+    return {
+        "id": row_id,
+        "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        **data,
+        **overrides,
+    }
+
+
+def _resolved(value) -> Future:
+    """An already-completed future holding value."""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class _ObjectScanner:
+    """Finds where the first JSON object closes in text that arrives in chunks.
+
+    Tracks brace depth in a single pass, ignoring braces inside JSON strings.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> int:
+        """Offset just past the object's closing brace within chunk, or -1."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif not self.started:
+                continue
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+
+# What _execute and the DB constraints rely on; compiled once at import.
+INSIGHT_SCHEMA = {
+    "type": "object",
+    "required": ["recommended_action", "position_size_pct", "sentiment", "confidence"],
+    "properties": {
+        "analysis": {"type": "string"},
+        "sentiment": {"enum": ["EXTREME_BEAR", "BEAR", "NEUTRAL", "BULL", "EXTREME_BULL"]},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "recommended_action": {"enum": ["SHORT", "HOLD", "CLOSE", "REDUCE", "INCREASE_SHORT"]},
+        "position_size_pct": {"type": "number", "minimum": 0, "maximum": 20},
+        "reasoning": {"type": "string"},
+        "signals_used": {"type": "array", "items": {"type": "string"}},
+    },
+}
+INSIGHT_VALIDATOR = jsonschema.Draft202012Validator(INSIGHT_SCHEMA)
+
+
+def _hold_stub(text: str, reason: str) -> dict:
+    """The do-nothing decision used when a reply can't be trusted."""
+    return {
+        "analysis": text[:500],
+        "sentiment": "NEUTRAL",
+        "confidence": 0.0,
+        "recommended_action": "HOLD",
+        "position_size_pct": 0,
+        "reasoning": reason,
+        "signals_used": [],
+        "fallback": True,
+    }
+
+
+def _message_text(message) -> str:
+    """The reply's text blocks joined, as messages.stream's text_stream yields them."""
+    return "".join(block.text for block in message.content if block.type == "text")
+
+
+def _parse_decision(text: str) -> dict:
+    """Decision dict from a model reply; a HOLD stub if it can't be parsed or is invalid."""
+    insight = _extract_json(text)
+    if insight is None:
+        return _hold_stub(text, "Failed to parse Claude's response as JSON")
+    error = next(INSIGHT_VALIDATOR.iter_errors(insight), None)
+    if error is not None:
+        path = "/".join(str(p) for p in error.absolute_path) or "decision"
+        return _hold_stub(text, f"Claude's decision failed validation ({path}: {error.message})")
+    return insight
+
+
+# Per-cycle user prompt. Compiled once at import; optional fields are skipped
+# when missing or falsy, exactly like the data sections always have been.
+PROMPT_TEMPLATE = Environment(
+    loader=BaseLoader(),
+    autoescape=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+).from_string("""## Current Market Data ({{ ts }})
+
+{% if snapshot.btc_price %}
+- BTC Price: ${{ "{:,.2f}".format(snapshot.btc_price) }} (24h: {{ "{:+.2f}".format(snapshot.get('btc_24h_change', 0)) }}%)
+{% endif %}
+{% if snapshot.eth_price %}
+- ETH Price: ${{ "{:,.2f}".format(snapshot.eth_price) }}
+{% endif %}
+{% if snapshot.deribit_btc_index %}
+- Deribit BTC Index: ${{ "{:,.2f}".format(snapshot.deribit_btc_index) }}
+{% endif %}
+
+## Deribit Perpetual Data
+{% if snapshot.deribit_mark_price %}
+- Mark Price: ${{ "{:,.2f}".format(snapshot.deribit_mark_price) }}
+{% endif %}
+{% if snapshot.get('funding_rate') is not none %}
+- Current Funding Rate: {{ snapshot.funding_rate }}
+{% endif %}
+{% if snapshot.open_interest %}
+- Open Interest: ${{ "{:,.0f}".format(snapshot.open_interest) }}
+{% endif %}
+{% if snapshot.deribit_volatility %}
+- Historical Volatility: {{ "{:.1f}".format(snapshot.deribit_volatility) }}%
+{% endif %}
+
+## Sentiment
+{% if snapshot.fear_greed_index %}
+- Fear & Greed Index: {{ snapshot.fear_greed_index }} ({{ snapshot.get('fear_greed_label', '') }})
+{% endif %}
+{% if snapshot.gold_price or snapshot.dxy_value or snapshot.treasury_10y or snapshot.fed_rate or snapshot.vix %}
+
+## Macro Indicators
+{% if snapshot.gold_price %}
+- Gold: ${{ "{:,.2f}".format(snapshot.gold_price) }}
+{% endif %}
+{% if snapshot.dxy_value %}
+- Dollar Index (DXY): {{ "{:.2f}".format(snapshot.dxy_value) }}
+{% endif %}
+{% if snapshot.treasury_10y %}
+- 10Y Treasury: {{ "{:.2f}".format(snapshot.treasury_10y) }}%
+{% endif %}
+{% if snapshot.fed_rate %}
+- Fed Funds Rate: {{ "{:.2f}".format(snapshot.fed_rate) }}%
+{% endif %}
+{% if snapshot.vix %}
+- VIX: {{ "{:.2f}".format(snapshot.vix) }}
+{% endif %}
+{% endif %}
+{% if snapshot.rsi_14 or snapshot.macd or snapshot.get('bb_position') is not none or snapshot.ema_50 or snapshot.atr_14 %}
+
+## Technical Indicators (1H)
+{% if snapshot.rsi_14 %}
+- RSI(14): {{ "{:.1f}".format(snapshot.rsi_14) }}
+{% endif %}
+{% if snapshot.macd %}
+- MACD: {{ "{:.2f}".format(snapshot.macd) }} (signal: {{ "{:.2f}".format(snapshot.get('macd_signal', 0)) }}, hist: {{ "{:.2f}".format(snapshot.get('macd_histogram', 0)) }})
+{% endif %}
+{% if snapshot.get('bb_position') is not none %}
+- Bollinger Band Position: {{ "{:.2f}".format(snapshot.bb_position) }} (0=lower, 1=upper)
+{% endif %}
+{% if snapshot.ema_50 %}
+- EMA(50): ${{ "{:,.2f}".format(snapshot.ema_50) }}
+{% endif %}
+{% if snapshot.atr_14 %}
+- ATR(14): ${{ "{:,.2f}".format(snapshot.atr_14) }}
+{% endif %}
+{% endif %}
+
+## Your Account
+{% if account.equity %}
+- Equity: {{ "{:.6f}".format(account.equity) }} BTC
+- Available Margin: {{ "{:.6f}".format(account.get('available_margin', 0)) }} BTC
+{% else %}
+- Account data unavailable
+{% endif %}
+
+## Current Position
+{% if position.size and position.size != 0 %}
+- Direction: {{ position.direction }}
+- Size: {{ position.size }} USD
+- Entry: ${{ "{:,.2f}".format(position.get('avg_entry_price', 0)) }}
+- Mark: ${{ "{:,.2f}".format(position.get('mark_price', 0)) }}
+- Unrealized PnL: {{ "{:.6f}".format(position.get('unrealized_pnl', 0)) }} BTC
+- Liquidation: ${{ "{:,.2f}".format(position.get('liquidation_price', 0)) }}
+{% else %}
+- FLAT (no position)
+{% endif %}
+{% if insights %}
+
+## Your Recent Decisions
+{% for ins in insights %}
+- [{{ ins.get('ts', '?') }}] {{ ins.get('recommended_action', '?') }} (sentiment: {{ ins.get('sentiment', '?') }}, confidence: {{ "{:.0%}".format(ins.get('confidence', 0)) }})
+{% endfor %}
+{% endif %}
+
+---
+Analyze the above data and respond with your JSON decision.""")
+
 class TradingAgent:
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+        self.client = anthropic.Anthropic(
+            api_key=Config.ANTHROPIC_API_KEY,
+            http_client=anthropic.DefaultHttpxClient(
+                http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT
+            ),
+        )
         self.deribit = DeribitClient()
-        self.market_data = MarketDataCollector(self.deribit)
+        # Account/position pushes, started by the first cycle (see _stream);
+        # REST is the fallback while the socket is down or silent
+        self.ws: Optional[DeribitWSClient] = None
         self.db = get_db()
         init_db(self.db)
+        self.market_data = MarketDataCollector(self.deribit, cache=load_market_cache(self.db))
+        # For escalation checks; seeded from the DB so a fresh process (one per
+        # cycle without --loop) compares against the last stored cycle
+        latest = get_recent_snapshots(self.db, limit=1)
+        self._prev_snapshot: Optional[dict] = (
+            _json_loads(latest[0]["raw_data"]) if latest and latest[0]["raw_data"] else None
+        )
+        self._tok_ema: float = get_state(self.db, _TOKENS_EMA_KEY, 512.0)
+        self._chars_per_token = 3.0  # errs high until a complete reply measures it
+        # Network fetches of a cycle run here concurrently; SQLite writes stay
+        # on the calling thread (the connection is thread-bound).
+        self._io_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="agent-io")
+        # The latest insight/trade rows, newest first. Primed from the DB once;
+        # after that every row this agent saves is also pushed here.
+        self._recent_insights = deque(get_recent_insights(self.db, limit=5), maxlen=5)
+        self._recent_trades = deque(get_recent_trades(self.db, limit=10), maxlen=10)
 
     def run_cycle(self) -> dict:
         """Execute one full analysis-decide-act cycle."""
+        # Every row the cycle writes goes out in one transaction: one commit
+        # (and journal sync) per cycle instead of one per insert. Rows written
+        # before a failure are still committed.
+        try:
+            return self._cycle()
+        finally:
+            self.db.commit()
+
+    def _cycle(self) -> dict:
         print(f"\n{'='*60}")
         print(f"  BEAR AGENT CYCLE — {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
         print(f"  Mode: {'🔴 LIVE' if Config.DERIBIT_LIVE else '🟡 TESTNET'}")
         print(f"{'='*60}")
 
+        # 1-2 are independent round-trips: start them together and pay only
+        # for the slowest one.
+        snapshot_f = self._io_pool.submit(self.market_data.collect_all)
+        ws = self._stream()
+        streamed_account = ws.account() if ws else None
+        streamed_position = ws.position() if ws else None
+        account_f = (_resolved(streamed_account) if streamed_account
+                     else self._io_pool.submit(self.deribit.get_account_summary, "BTC"))
+        position_f = (_resolved(streamed_position) if streamed_position
+                      else self._io_pool.submit(self.deribit.get_position, "BTC-PERPETUAL"))
+
         # 1. Collect market data
         print("\n[1/5] Collecting market data...")
-        snapshot = self.market_data.collect_all()
-        snapshot_id = save_market_snapshot(self.db, snapshot)
+        snapshot = snapshot_f.result()
+        snapshot_id = save_market_snapshot(self.db, snapshot, commit=False)
+        save_market_cache(self.db, self.market_data.pop_cache_updates(), commit=False)
         print(f"  BTC: ${snapshot.get('btc_price', '?'):,.0f} | "
               f"F&G: {snapshot.get('fear_greed_index', '?')} ({snapshot.get('fear_greed_label', '?')}) | "
               f"Funding: {snapshot.get('funding_rate', '?')}")
 
         # 2. Get current account & position state
         print("\n[2/5] Checking account & positions...")
-        account_info = self._get_account_state()
-        position_info = self._get_position_state()
+        account_info = self._get_account_state(account_f)
+        position_info = self._get_position_state(position_f)
 
         # 3. Get historical context
         print("\n[3/5] Loading historical context...")
-        recent_insights = get_recent_insights(self.db, limit=5)
-        recent_trades = get_recent_trades(self.db, limit=10)
+        recent_insights = list(self._recent_insights)
+        recent_trades = list(self._recent_trades)
 
-        # 4. Ask Claude for analysis
+        # 4. Ask Claude for analysis, unless a recent cycle saw the same market
         print("\n[4/5] Consulting Claude...")
-        insight = self._analyze(snapshot, account_info, position_info, recent_insights, recent_trades)
+        fingerprint = snapshot_fingerprint(snapshot, position_info)
+        direction = position_info.get("direction")
+        cached = get_cached_insight(self.db, fingerprint, INSIGHT_REUSE_SECS, direction)
+        if cached:
+            cached_ts, insight = cached
+            print(f"  Market unchanged — reusing decision from "
+                  f"{(time.time() - cached_ts) / 60:.0f} min ago")
+        else:
+            insight = self._analyze(snapshot, account_info, position_info, recent_insights, recent_trades)
+            if not insight.get("fallback"):
+                save_cached_insight(self.db, fingerprint, insight, direction, INSIGHT_REUSE_SECS, commit=False)
         insight["market_snapshot_id"] = snapshot_id
-        insight_id = save_insight(self.db, insight)
+        self._prev_snapshot = snapshot
+        insight_id = save_insight(self.db, insight, commit=False)
+        signals = json.dumps(insight.get("signals_used", []), separators=(",", ":"), ensure_ascii=False)
+        self._recent_insights.appendleft(_row(insight_id, insight, signals_used=signals))
 
         print(f"  Sentiment: {insight.get('sentiment')} (confidence: {insight.get('confidence', 0):.0%})")
         print(f"  Action: {insight.get('recommended_action')} | Size: {insight.get('position_size_pct', 0)}%")
         print(f"  Analysis: {insight.get('analysis', '')[:120]}...")
 
-        # 5. Execute trade if recommended
+        # 5. Execute trade if recommended. A reused decision was already acted
+        # on for this exact market and position; sending it again would stack
+        # the same order every cycle without the model ever being asked.
         print("\n[5/5] Executing decision...")
-        trade_result = self._execute(insight, insight_id, position_info)
+        if cached:
+            print("  Reused decision — not executing it again.")
+            trade_result = None
+        else:
+            trade_result = self._execute(insight, insight_id, position_info)
 
         result = {
             "snapshot": snapshot,
@@ -135,9 +534,17 @@ class TradingAgent:
 
         return result
 
-    def _get_account_state(self) -> dict:
+    def _stream(self) -> Optional[DeribitWSClient]:
+        """The account/position stream, started on first use; None without credentials."""
+        if self.ws is None and Config.DERIBIT_CLIENT_ID and Config.DERIBIT_CLIENT_SECRET:
+            self.ws = DeribitWSClient()
+            self.ws.start()
+        return self.ws
+
+    def _get_account_state(self, pending: Optional[Future] = None) -> dict:
+        """Build (and save) the account snapshot, from an in-flight fetch if given."""
         try:
-            acct = self.deribit.get_account_summary("BTC")
+            acct = pending.result() if pending else self.deribit.get_account_summary("BTC")
             info = {
                 "equity": acct.get("equity"),
                 "balance": acct.get("balance"),
@@ -146,16 +553,17 @@ class TradingAgent:
                 "total_pnl": acct.get("total_pl"),
                 "currency": "BTC",
             }
-            save_account_snapshot(self.db, info)
+            save_account_snapshot(self.db, info, commit=False)
             print(f"  Equity: {info['equity']:.6f} BTC | Available: {info['available_margin']:.6f} BTC")
             return info
         except Exception as e:
             print(f"  [warn] Could not fetch account: {e}")
             return {}
 
-    def _get_position_state(self) -> dict:
+    def _get_position_state(self, pending: Optional[Future] = None) -> dict:
+        """Build (and save) the position snapshot, from an in-flight fetch if given."""
         try:
-            pos = self.deribit.get_position("BTC-PERPETUAL")
+            pos = pending.result() if pending else self.deribit.get_position("BTC-PERPETUAL")
             info = {
                 "instrument": "BTC-PERPETUAL",
                 "direction": pos.get("direction"),
@@ -167,7 +575,7 @@ class TradingAgent:
                 "realized_pnl": pos.get("realized_profit_loss"),
             }
             if info["size"] and info["size"] != 0:
-                save_position_snapshot(self.db, info)
+                save_position_snapshot(self.db, info, commit=False)
                 print(f"  Position: {info['direction']} {info['size']} @ ${info['avg_entry_price']:,.0f} | "
                       f"PnL: {info['unrealized_pnl']:.6f} BTC")
             else:
@@ -188,35 +596,102 @@ class TradingAgent:
     ) -> dict:
         """Ask Claude to analyze the market and recommend an action."""
         user_msg = self._build_prompt(snapshot, account, position, recent_insights, recent_trades)
-
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
+        deep = should_escalate(snapshot, self._prev_snapshot, position, account)
+        model = Config.DEEP_MODEL if deep else Config.FAST_MODEL
+        max_tokens = self._max_tokens()
+
+        # Stream the reply and hang up as soon as the decision object closes;
+        # anything the model adds after it is neither waited for nor generated.
+        parts = []
+        scanner = _ObjectScanner()
+        stopped_early = False
+        with self.client.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
             system=SYSTEM_PROMPT,
             messages=[{"role": "user", "content": user_msg}],
-        )
-
-        text = response.content[0].text.strip()
-
-        # Extract JSON from response (handle markdown code blocks)
-        if "```" in text:
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            return {
-                "analysis": text[:500],
-                "sentiment": "NEUTRAL",
-                "confidence": 0.0,
-                "recommended_action": "HOLD",
-                "position_size_pct": 0,
-                "reasoning": "Failed to parse Claude's response as JSON",
-                "signals_used": [],
-            }
+        ) as stream:
+            for chunk in stream.text_stream:
+                end = scanner.feed(chunk)
+                if end >= 0:
+                    parts.append(chunk[:end])
+                    stopped_early = True
+                    break
+                parts.append(chunk)
+            usage = stream.current_message_snapshot.usage
+        text = "".join(parts)
+
+        if stopped_early:
+            # The snapshot's output count only moves on message_delta, which
+            # follows the text we hung up on; until then it holds message_start's
+            # placeholder. Scale by the ratio measured on the last complete reply.
+            estimate = math.ceil(len(text) / self._chars_per_token)
+            used = max(usage.output_tokens, estimate) + _EARLY_STOP_MARGIN
+            out = f"~{used} out (stopped at closing brace)"
+        else:
+            used = usage.output_tokens
+            out = f"{used} out"
+            if used >= max_tokens:
+                used = max_tokens  # truncated: the EMA steps up from here
+            elif used:
+                self._chars_per_token = len(text) / used
+        self._tok_ema = 0.8 * self._tok_ema + 0.2 * used
+        set_state(self.db, _TOKENS_EMA_KEY, self._tok_ema, commit=False)
+
+        print(f"  Model: {model}{' (escalated)' if deep else ''}")
+        print(f"  Tokens: {usage.input_tokens} in | {out} / max {max_tokens}")
+
+        return _parse_decision(text.strip())
+
+    def _max_tokens(self) -> int:
+        return min(MAX_TOKENS, max(MIN_TOKENS, int(self._tok_ema * 1.3)))
+
+    def batch_analyze(self, snapshots: list) -> list:
+        """Re-analyze stored market snapshots through the Message Batches API.
+
+        Batches are billed at half price and run concurrently on Anthropic's
+        side, which suits backfills/replays that don't need an answer now.
+        Each prompt carries the account, position and earlier decisions stored
+        with its snapshot (see get_context_at). Blocks until the batch ends;
+        returns one decision per snapshot, in order.
+        """
+        requests = []
+        for snap in snapshots:
+            data = _json_loads(snap["raw_data"]) if snap.get("raw_data") else snap
+            as_of = datetime.strptime(snap["ts"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+            account, position, insights = get_context_at(self.db, snap)
+            prompt = self._build_prompt(data, account, position, insights, [], as_of=as_of)
+            requests.append({
+                "custom_id": str(snap["id"]),
+                "params": {
+                    "model": Config.DEEP_MODEL,
+                    "max_tokens": self._max_tokens(),
+                    "system": SYSTEM_PROMPT,
+                    "messages": [{"role": "user", "content": prompt}],
+                },
+            })
+
+        batch = self.client.messages.batches.create(requests=requests)
+        print(f"  Batch {batch.id} submitted ({len(requests)} requests)")
+        delay = 60
+        while batch.processing_status != "ended":
+            time.sleep(delay)
+            delay = min(delay * 2, 600)
+            batch = self.client.messages.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"  Batch {batch.id}: {counts.processing} processing, {counts.succeeded} done")
+
+        decisions = {}
+        for entry in self.client.messages.batches.results(batch.id):
+            result = entry.result
+            if result.type == "succeeded":
+                decisions[entry.custom_id] = _parse_decision(_message_text(result.message).strip())
+            elif result.type == "errored":
+                error = result.error.error
+                decisions[entry.custom_id] = _hold_stub("", f"batch result errored ({error.type}: {error.message})")
+            else:
+                decisions[entry.custom_id] = _hold_stub("", f"batch result {result.type}")
+        return [decisions.get(str(snap["id"])) or _hold_stub("", "batch result missing") for snap in snapshots]
 
     def _build_prompt(
         self,
@@ -225,97 +700,16 @@ class TradingAgent:
         position: dict,
         recent_insights: list,
         recent_trades: list,
+        as_of: Optional[datetime] = None,
     ) -> str:
-        ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-
-        sections = [f"## Current Market Data ({ts})\n"]
-
-        # Price data
-        if snapshot.get("btc_price"):
-            sections.append(f"- BTC Price: ${snapshot['btc_price']:,.2f} (24h: {snapshot.get('btc_24h_change', 0):+.2f}%)")
-        if snapshot.get("eth_price"):
-            sections.append(f"- ETH Price: ${snapshot['eth_price']:,.2f}")
-        if snapshot.get("deribit_btc_index"):
-            sections.append(f"- Deribit BTC Index: ${snapshot['deribit_btc_index']:,.2f}")
-
-        # Deribit specifics
-        sections.append("\n## Deribit Perpetual Data")
-        if snapshot.get("deribit_mark_price"):
-            sections.append(f"- Mark Price: ${snapshot['deribit_mark_price']:,.2f}")
-        if snapshot.get("funding_rate") is not None:
-            sections.append(f"- Current Funding Rate: {snapshot['funding_rate']}")
-        if snapshot.get("open_interest"):
-            sections.append(f"- Open Interest: ${snapshot['open_interest']:,.0f}")
-        if snapshot.get("deribit_volatility"):
-            sections.append(f"- Historical Volatility: {snapshot['deribit_volatility']:.1f}%")
-
-        # Sentiment
-        sections.append("\n## Sentiment")
-        if snapshot.get("fear_greed_index"):
-            sections.append(f"- Fear & Greed Index: {snapshot['fear_greed_index']} ({snapshot.get('fear_greed_label', '')})")
-
-        # Macro
-        macro_items = []
-        if snapshot.get("gold_price"):
-            macro_items.append(f"- Gold: ${snapshot['gold_price']:,.2f}")
-        if snapshot.get("dxy_value"):
-            macro_items.append(f"- Dollar Index (DXY): {snapshot['dxy_value']:.2f}")
-        if snapshot.get("treasury_10y"):
-            macro_items.append(f"- 10Y Treasury: {snapshot['treasury_10y']:.2f}%")
-        if snapshot.get("fed_rate"):
-            macro_items.append(f"- Fed Funds Rate: {snapshot['fed_rate']:.2f}%")
-        if snapshot.get("vix"):
-            macro_items.append(f"- VIX: {snapshot['vix']:.2f}")
-        if macro_items:
-            sections.append("\n## Macro Indicators")
-            sections.extend(macro_items)
-
-        # Technicals
-        ta_items = []
-        if snapshot.get("rsi_14"):
-            ta_items.append(f"- RSI(14): {snapshot['rsi_14']:.1f}")
-        if snapshot.get("macd"):
-            ta_items.append(f"- MACD: {snapshot['macd']:.2f} (signal: {snapshot.get('macd_signal', 0):.2f}, hist: {snapshot.get('macd_histogram', 0):.2f})")
-        if snapshot.get("bb_position") is not None:
-            ta_items.append(f"- Bollinger Band Position: {snapshot['bb_position']:.2f} (0=lower, 1=upper)")
-        if snapshot.get("ema_50"):
-            ta_items.append(f"- EMA(50): ${snapshot['ema_50']:,.2f}")
-        if snapshot.get("atr_14"):
-            ta_items.append(f"- ATR(14): ${snapshot['atr_14']:,.2f}")
-        if ta_items:
-            sections.append("\n## Technical Indicators (1H)")
-            sections.extend(ta_items)
-
-        # Account
-        sections.append("\n## Your Account")
-        if account.get("equity"):
-            sections.append(f"- Equity: {account['equity']:.6f} BTC")
-            sections.append(f"- Available Margin: {account.get('available_margin', 0):.6f} BTC")
-        else:
-            sections.append("- Account data unavailable")
-
-        # Position
-        sections.append("\n## Current Position")
-        if position.get("size") and position["size"] != 0:
-            sections.append(f"- Direction: {position['direction']}")
-            sections.append(f"- Size: {position['size']} USD")
-            sections.append(f"- Entry: ${position.get('avg_entry_price', 0):,.2f}")
-            sections.append(f"- Mark: ${position.get('mark_price', 0):,.2f}")
-            sections.append(f"- Unrealized PnL: {position.get('unrealized_pnl', 0):.6f} BTC")
-            sections.append(f"- Liquidation: ${position.get('liquidation_price', 0):,.2f}")
-        else:
-            sections.append("- FLAT (no position)")
-
-        # Recent history
-        if recent_insights:
-            sections.append("\n## Your Recent Decisions")
-            for ins in recent_insights[:3]:
-                sections.append(f"- [{ins.get('ts', '?')}] {ins.get('recommended_action', '?')} "
-                              f"(sentiment: {ins.get('sentiment', '?')}, confidence: {ins.get('confidence', 0):.0%})")
-
-        sections.append("\n---\nAnalyze the above data and respond with your JSON decision.")
-
-        return "\n".join(sections)
+        ts = (as_of or datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M UTC")
+        return PROMPT_TEMPLATE.render(
+            ts=ts,
+            snapshot=snapshot,
+            account=account,
+            position=position,
+            insights=recent_insights[:3],
+        )
 
     def _execute(self, insight: dict, insight_id: int, position: dict) -> Optional[dict]:
         """Execute the recommended trade action on Deribit."""
@@ -341,7 +735,8 @@ class TradingAgent:
                     "status": "filled",
                     "notes": f"CLOSE: {insight.get('reasoning', '')}",
                 }
-                save_trade(self.db, trade_data)
+                trade_id = save_trade(self.db, trade_data, commit=False)
+                self._recent_trades.appendleft(_row(trade_id, trade_data))
                 print(f"  CLOSED position: {position['size']} USD")
                 return trade_data
             except Exception as e:
@@ -352,9 +747,8 @@ class TradingAgent:
             if not position.get("size") or position["size"] == 0:
                 print("  Action: REDUCE — but no position to reduce.")
                 return None
-            reduce_amount = abs(position["size"]) // 2  # Reduce by half
-            if reduce_amount < 10:
-                reduce_amount = 10  # Minimum order size on Deribit is 10 USD
+            # Half the position, in whole 10 USD contracts; Deribit's minimum is 10 USD
+            reduce_amount = max(10, int(abs(position["size"])) // 20 * 10)
             try:
                 # To reduce a short, we buy
                 result = self.deribit.buy("BTC-PERPETUAL", reduce_amount)
@@ -367,7 +761,8 @@ class TradingAgent:
                     "status": "filled",
                     "notes": f"REDUCE: {insight.get('reasoning', '')}",
                 }
-                save_trade(self.db, trade_data)
+                trade_id = save_trade(self.db, trade_data, commit=False)
+                self._recent_trades.appendleft(_row(trade_id, trade_data))
                 print(f"  REDUCED short by {reduce_amount} USD")
                 return trade_data
             except Exception as e:
@@ -379,14 +774,15 @@ class TradingAgent:
             btc_price = position.get("mark_price") or 50000
             equity_btc = 0.1  # Default if account data unavailable
             try:
-                acct = self.deribit.get_account_summary("BTC")
+                acct = (self.ws and self.ws.account()) or self.deribit.get_account_summary("BTC")
                 equity_btc = acct.get("available_funds", 0.1)
             except Exception:
                 pass
 
-            equity_usd = equity_btc * btc_price
-            trade_usd = equity_usd * (size_pct / 100)
-            trade_usd = max(10, int(trade_usd / 10) * 10)  # Round to 10 USD increments, min 10
+            # Sized in integer cents (size_pct is a percentage, so the product is
+            # already USD x 100), then floored to 10 USD contracts, min 10
+            usd_cents = int(equity_btc * btc_price * size_pct)
+            trade_usd = max(10, usd_cents // 1000 * 10)
 
             try:
                 result = self.deribit.sell("BTC-PERPETUAL", trade_usd)
@@ -399,7 +795,8 @@ class TradingAgent:
                     "status": "filled",
                     "notes": f"{action}: {insight.get('reasoning', '')}",
                 }
-                save_trade(self.db, trade_data)
+                trade_id = save_trade(self.db, trade_data, commit=False)
+                self._recent_trades.appendleft(_row(trade_id, trade_data))
                 print(f"  SHORT {trade_usd} USD of BTC-PERPETUAL")
                 return trade_data
             except Exception as e:
@@ -16,6 +16,12 @@ import os
 import subprocess
 import platform
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from backtest.fetch_dataset import build_dataset
 from backtest.engine import run_backtest
@@ -35,6 +41,20 @@ def open_file(path: str):
         print(f"  Open manually: file://{abs_path}")
 
 
+def _dump_json(results: dict, path: str):
+    if orjson is not None:
+        data = orjson.dumps(
+            results,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC,
+            default=str,
+        )
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+    with open(path, "w") as f:
+        json.dump(results, f, separators=(",", ":"), default=str)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run backtest with sliding-window CV")
     parser.add_argument("--folds", type=int, default=3, help="Max folds to run (default: 3)")
@@ -76,12 +96,13 @@ def main():
     results_dir = os.path.join(os.path.dirname(__file__), "..", "reports")
     os.makedirs(results_dir, exist_ok=True)
     results_path = os.path.join(results_dir, "backtest-results-latest.json")
-    with open(results_path, "w") as f:
-        json.dump(results, f, indent=2, default=str)
-    print(f"\nRaw results: {results_path}")
 
-    # Generate report
-    report_path = generate_backtest_report(results)
+    # Write raw results and generate report concurrently (report does not mutate results)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        dump = pool.submit(_dump_json, results, results_path)
+        report_path = generate_backtest_report(results)
+        dump.result()
+    print(f"\nRaw results: {results_path}")
     print(f"Report: {report_path}")
     open_file(report_path)
 
@@ -7,21 +7,26 @@ Usage:
     python run.py              # Run one analysis cycle + generate report
     python run.py --loop       # Run continuously (every 15 min)
     python run.py --report     # Generate report from existing data only
+    python run.py --backfill N # Re-analyze the last N stored snapshots (batch API)
 """
 
 import sys
-import time
 import os
+import signal
+import asyncio
 import subprocess
 import platform
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from agent.trader import TradingAgent
-from agent.report import generate_report
+from agent.report import generate_report, flush_report_writes
 from agent.config import Config
+from agent.database import get_recent_snapshots
 
 
 def open_report(path: str):
     """Open HTML report in the default browser."""
+    flush_report_writes()
     abs_path = os.path.abspath(path)
     url = f"file://{abs_path}"
     try:
@@ -66,9 +71,27 @@ def main():
         open_report(path)
         return
 
+    backfill = None
+    if "--backfill" in sys.argv:
+        idx = sys.argv.index("--backfill") + 1
+        value = sys.argv[idx] if idx < len(sys.argv) else ""
+        if not value.isdigit() or int(value) == 0:
+            print("Usage: python run.py --backfill N   # N = number of stored snapshots, e.g. 96")
+            sys.exit(2)
+        backfill = int(value)
+
     validate_config()
 
-    agent = TradingAgent()
+    # Backfill mode: re-analyze stored snapshots via the (half-price) batch API
+    if backfill is not None:
+        agent = TradingAgent()
+        snapshots = get_recent_snapshots(agent.db, limit=backfill)
+        print(f"Re-analyzing {len(snapshots)} snapshots via the Message Batches API...")
+        for snap, insight in zip(snapshots, agent.batch_analyze(snapshots)):
+            print(f"  [{snap['ts']}] {insight.get('recommended_action')} "
+                  f"({insight.get('sentiment')}, confidence {insight.get('confidence') or 0:.0%})")
+        return
+
     loop = "--loop" in sys.argv
     interval = 900  # 15 minutes
 
@@ -88,33 +111,97 @@ def main():
         print("  Testnet mode — paper trading (safe)")
     print()
 
-    while True:
+    try:
+        asyncio.run(main_async(loop, interval))
+    except KeyboardInterrupt:
+        # Platforms without loop signal handlers (Windows) still get a clean exit
+        print("\n\nShutting down gracefully...")
+
+
+PREWARM_LEAD = 60  # seconds before the next cycle to refresh slow-moving data
+
+
+async def _prewarm(agent: TradingAgent, delay: float):
+    """Refresh the collector's slow sources in a worker shortly before the next cycle."""
+    await asyncio.sleep(delay)
+    await asyncio.to_thread(agent.market_data.prewarm, PREWARM_LEAD)
+
+
+def _report_done(future: Future):
+    """Announce and open a report rendered in the background."""
+    try:
+        report_path = future.result()
+    except Exception as e:
+        print(f"\n[ERROR] Report failed: {e}")
+        return
+    print(f"Report: {report_path}")
+    open_report(report_path)
+
+
+async def main_async(loop: bool, interval: int):
+    """Run cycles until done; Ctrl+C is acknowledged at once and ends the run
+    after the current cycle (or immediately, between cycles)."""
+    stop = asyncio.Event()
+
+    def request_stop():
+        if not stop.is_set():
+            print("\n\nCtrl+C received — stopping after the current step...")
+            stop.set()
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGINT, request_stop)
+    except (NotImplementedError, RuntimeError):
+        pass  # no loop signal handlers here; Ctrl+C raises KeyboardInterrupt instead
+
+    # Cycles block on network and model calls for up to minutes, so they run
+    # on one dedicated worker thread and the loop stays free for signals, the
+    # prewarm task and report callbacks. The agent is built on that thread
+    # because its SQLite connection is bound to the thread that opened it.
+    # Reports render on another; generate_report opens its own connection.
+    cycles = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cycle")
+    reports = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+    try:
+        agent = await asyncio.get_running_loop().run_in_executor(cycles, TradingAgent)
+        await _run_cycles(agent, cycles, loop, interval, stop, reports)
+    finally:
+        cycles.shutdown(wait=True)
+        reports.shutdown(wait=True)  # let the last report finish and open
+
+    if stop.is_set():
+        print("\nShutting down gracefully...")
+
+
+async def _run_cycles(agent: TradingAgent, cycles: ThreadPoolExecutor, loop: bool,
+                      interval: int, stop: asyncio.Event, reports: ThreadPoolExecutor):
+    while not stop.is_set():
         try:
-            result = agent.run_cycle()
+            result = await asyncio.get_running_loop().run_in_executor(cycles, agent.run_cycle)
 
             # Generate report
             print("\nGenerating report...")
-            report_path = generate_report(result)
-            print(f"Report: {report_path}")
-            open_report(report_path)
+            reports.submit(generate_report, result).add_done_callback(_report_done)
 
-        except KeyboardInterrupt:
-            print("\n\nShutting down gracefully...")
-            break
         except Exception as e:
             print(f"\n[ERROR] Cycle failed: {e}")
             import traceback
             traceback.print_exc()
 
-        if not loop:
+        if not loop or stop.is_set():
             break
 
         print(f"\nNext cycle in {interval // 60} minutes... (Ctrl+C to stop)")
+        prewarm = asyncio.create_task(_prewarm(agent, interval - PREWARM_LEAD))
         try:
-            time.sleep(interval)
-        except KeyboardInterrupt:
-            print("\n\nShutting down gracefully...")
-            break
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        if stop.is_set():
+            prewarm.cancel()
+        else:
+            try:
+                await prewarm  # never overlap a slow prewarm with the cycle
+            except Exception as e:
+                print(f"  [warn] Prewarm failed: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+import pytest
+
+from agent.config import Config
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    """A TradingAgent on a scratch database; nothing touches the network until called."""
+    from agent.trader import TradingAgent
+
+    monkeypatch.setattr(Config, "DB_PATH", str(tmp_path / "trading.db"))
+    monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+    instance = TradingAgent()
+    yield instance
+    instance._io_pool.shutdown(wait=False)
+    instance.db.close()
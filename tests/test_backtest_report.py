@@ -0,0 +1,57 @@
+"""Backtest report view helpers."""
+
+import random
+
+import pytest
+
+from backtest.report import _timeline_segments
+
+ACTIONS = ["HOLD", "SHORT", "INCREASE_SHORT", "REDUCE", "CLOSE", "FINAL_CLOSE"]
+
+
+def reference_segments(equity_curve):
+    """The per-point state machine the timeline template used to run, with
+    consecutive points of the same state merged into one segment."""
+    n = len(equity_curve)
+    if n < 2:
+        return []
+    states = []
+    in_position = heavy = False
+    for pt in equity_curve:
+        act = pt.get("action", "HOLD")
+        if act in ("SHORT", "INCREASE_SHORT"):
+            in_position = True
+            heavy = heavy or act == "INCREASE_SHORT"
+        elif act in ("CLOSE", "FINAL_CLOSE"):
+            in_position = heavy = False
+        states.append(("heavy", "Heavy short") if heavy else ("short", "Short") if in_position else ("flat", "Flat"))
+    runs = []
+    for state in states:
+        if runs and runs[-1][0] == state:
+            runs[-1][1] += 1
+        else:
+            runs.append([state, 1])
+    return [(*state, f"{count * 100.0 / n:.4f}") for state, count in runs]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_timeline_segments_match_the_template_loop(seed):
+    rng = random.Random(seed)
+    weights = rng.choice([None, [8, 1, 1, 1, 1, 0], [1, 3, 3, 1, 3, 1]])
+    curve = [{"action": a} for a in rng.choices(ACTIONS, weights, k=rng.randint(0, 150))]
+    if curve and seed % 7 == 0:
+        del curve[rng.randrange(len(curve))]["action"]  # missing action counts as HOLD
+    assert _timeline_segments(curve) == reference_segments(curve)
+
+
+@pytest.mark.parametrize("actions, expected", [
+    (["HOLD"], []),
+    (["HOLD", "HOLD"], [("flat", "Flat", "100.0000")]),
+    (["SHORT", "SHORT", "CLOSE", "HOLD"], [("short", "Short", "50.0000"), ("flat", "Flat", "50.0000")]),
+    (["SHORT", "INCREASE_SHORT", "REDUCE", "FINAL_CLOSE"],
+     [("short", "Short", "25.0000"), ("heavy", "Heavy short", "50.0000"), ("flat", "Flat", "25.0000")]),
+    (["INCREASE_SHORT", "CLOSE", "SHORT"],
+     [("heavy", "Heavy short", "33.3333"), ("flat", "Flat", "33.3333"), ("short", "Short", "33.3333")]),
+])
+def test_timeline_segments_examples(actions, expected):
+    assert _timeline_segments([{"action": a} for a in actions]) == expected
@@ -0,0 +1,130 @@
+"""Schema migration and compressed free-text storage."""
+
+import random
+import sqlite3
+
+import pytest
+
+from agent import database
+from agent.database import (
+    fetch_report_bundle,
+    get_cached_insight,
+    get_db,
+    get_recent_insights,
+    get_recent_trades,
+    init_db,
+    save_cached_insight,
+    save_insight,
+    save_trade,
+)
+
+# agent_insights / trades as the code before the *_zst columns created them
+PRE_ZSTD_SCHEMA = """
+CREATE TABLE agent_insights (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+    market_snapshot_id INTEGER,
+    analysis TEXT NOT NULL,
+    sentiment TEXT,
+    confidence REAL,
+    recommended_action TEXT,
+    position_size_pct REAL,
+    reasoning TEXT,
+    signals_used TEXT
+);
+CREATE TABLE trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+    insight_id INTEGER,
+    instrument TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL,
+    order_type TEXT DEFAULT 'market',
+    order_id TEXT,
+    status TEXT DEFAULT 'pending',
+    pnl REAL,
+    notes TEXT
+);
+CREATE TABLE market_snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, raw_data TEXT);
+CREATE TABLE positions (id INTEGER PRIMARY KEY AUTOINCREMENT, instrument TEXT);
+CREATE TABLE account_snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, equity REAL);
+INSERT INTO agent_insights (analysis, recommended_action, reasoning, signals_used)
+    VALUES ('Old analysis', 'HOLD', 'Old reasoning', '[]');
+INSERT INTO trades (instrument, direction, amount, status, notes)
+    VALUES ('BTC-PERPETUAL', 'sell', 100, 'filled', 'Old note');
+"""
+
+WORDS = (
+    "funding open interest rally resistance support macro dollar yields gold "
+    "short squeeze liquidity momentum volatility bearish divergence breakdown"
+).split()
+
+
+@pytest.fixture(autouse=True)
+def _reset_zstd(monkeypatch):
+    monkeypatch.setattr(database, "_zstd_compressor", None)
+    monkeypatch.setattr(database, "_zstd_untrained_saves", 0)
+    monkeypatch.setattr(database, "_zstd_dicts", {})
+
+
+def _prose(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def test_get_db_migrates_pre_zstd_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    old = sqlite3.connect(path)
+    old.executescript(PRE_ZSTD_SCHEMA)
+    old.close()
+
+    conn = get_db(path)
+    bundle = fetch_report_bundle(conn)
+    assert bundle["trades"][0].notes == "Old note"
+    assert bundle["insights"][0].analysis == "Old analysis"
+    assert get_recent_insights(conn)[0]["reasoning"] == "Old reasoning"
+    assert get_recent_trades(conn)[0]["notes"] == "Old note"
+
+
+def test_get_db_leaves_missing_tables_to_init_db(tmp_path):
+    conn = get_db(str(tmp_path / "new.db"))
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+    init_db(conn)
+    assert fetch_report_bundle(conn)["trades"] == []
+
+
+@pytest.mark.skipif(database.zstandard is None, reason="zstandard not installed")
+def test_dictionary_is_trained_once_enough_prose_is_saved(tmp_path):
+    rng = random.Random(7)
+    conn = get_db(str(tmp_path / "agent.db"))
+    init_db(conn)
+    assert database._zstd_compressor is None
+
+    texts = []
+    for _ in range(database._ZSTD_MIN_SAMPLES // 2 + database._ZSTD_RETRAIN_EVERY):
+        texts.append((_prose(rng, 60), _prose(rng, 40)))
+        save_insight(conn, {"analysis": texts[-1][0], "reasoning": texts[-1][1], "recommended_action": "HOLD"})
+        save_trade(conn, {"instrument": "BTC-PERPETUAL", "direction": "sell", "amount": 10, "notes": _prose(rng, 8)})
+    assert database._zstd_compressor is not None
+
+    analysis, reasoning = _prose(rng, 80), _prose(rng, 50)
+    insight_id = save_insight(conn, {"analysis": analysis, "reasoning": reasoning, "recommended_action": "HOLD"})
+    stored = conn.execute("SELECT * FROM agent_insights WHERE id = ?", (insight_id,)).fetchone()
+    assert stored["analysis"] == "" and stored["analysis_zst"] is not None
+
+    # Readers (and a fresh process) restore the text
+    database._zstd_dicts.clear()
+    latest = get_recent_insights(conn, limit=1)[0]
+    assert (latest["analysis"], latest["reasoning"]) == (analysis, reasoning)
+    assert get_recent_insights(conn, limit=200)[-1]["analysis"] == texts[0][0]
+
+
+def test_saving_a_cached_insight_drops_expired_entries(tmp_path):
+    conn = get_db(str(tmp_path / "agent.db"))
+    init_db(conn)
+    save_cached_insight(conn, "old", {"recommended_action": "HOLD"}, "sell", max_age=3600)
+    conn.execute("UPDATE cached_insights SET ts = ts - 3601")
+    save_cached_insight(conn, "new", {"recommended_action": "SHORT"}, "sell", max_age=3600)
+
+    assert [r["key"] for r in conn.execute("SELECT key FROM cached_insights")] == ["new"]
+    assert get_cached_insight(conn, "new", 3600, "sell")[1] == {"recommended_action": "SHORT"}
@@ -0,0 +1,122 @@
+"""Market data collection and the incremental technical indicators."""
+
+import copy
+import random
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agent import market_data
+from agent.deribit_client import DeribitClient
+from agent.market_data import MarketDataCollector, TAState
+
+HOUR_MS = 3600 * 1000
+
+# Rounding step of each field; incremental sums may land one step away
+STEPS = {"macd": 0.01, "macd_signal": 0.01, "macd_histogram": 0.01}
+
+
+def reference_indicators(high, low, close):
+    """The full-history pandas pass TAState replaced."""
+    close, high, low = pd.Series(close), pd.Series(high), pd.Series(low)
+    if len(close) < 26:
+        return {}
+    result = {}
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0.0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0.0)).rolling(14).mean()
+    rsi = 100 - (100 / (1 + gain / loss.replace(0, np.nan)))
+    if pd.notna(rsi.iloc[-1]):
+        result["rsi_14"] = round(float(rsi.iloc[-1]), 4)
+    macd_line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal_line = macd_line.ewm(span=9, adjust=False).mean()
+    result["macd"] = round(float(macd_line.iloc[-1]), 2)
+    result["macd_signal"] = round(float(signal_line.iloc[-1]), 2)
+    result["macd_histogram"] = round(float(macd_line.iloc[-1] - signal_line.iloc[-1]), 2)
+    bb_mid, bb_std = close.rolling(20).mean(), close.rolling(20).std()
+    result["bb_middle"] = round(float(bb_mid.iloc[-1]), 4)
+    result["bb_upper"] = round(float(bb_mid.iloc[-1] + 2 * bb_std.iloc[-1]), 4)
+    result["bb_lower"] = round(float(bb_mid.iloc[-1] - 2 * bb_std.iloc[-1]), 4)
+    bb_range = result["bb_upper"] - result["bb_lower"]
+    if bb_range > 0:
+        result["bb_position"] = round((float(close.iloc[-1]) - result["bb_lower"]) / bb_range, 4)
+    if len(close) >= 50:
+        result["ema_50"] = round(float(close.ewm(span=50, adjust=False).mean().iloc[-1]), 4)
+    tr = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+    result["atr_14"] = round(float(tr.rolling(14).mean().iloc[-1]), 4)
+    return result
+
+
+def assert_matches_reference(got, high, low, close):
+    expected = reference_indicators(high, low, close)
+    assert got.keys() == expected.keys()
+    for key, value in expected.items():
+        assert got[key] == pytest.approx(value, abs=STEPS.get(key, 1e-4) * 1.01), key
+
+
+def random_bars(rng, n, flat_run=False):
+    close = [60000.0]
+    for _ in range(n - 1):
+        close.append(close[-1] * (1 + rng.gauss(0, 0.01)))
+    if flat_run:
+        close[-14:] = [close[-14]] * 14  # no losses in the RSI window
+    high = [c + rng.uniform(0, 300) for c in close]
+    low = [c - rng.uniform(0, 300) for c in close]
+    return high, low, close
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_ta_state_matches_the_full_pandas_pass(seed):
+    rng = random.Random(seed)
+    high, low, close = random_bars(rng, rng.randint(20, 220), flat_run=seed % 5 == 0)
+    state = TAState()
+    for i, bar in enumerate(zip(high, low, close)):
+        state.push(i * HOUR_MS, *bar)
+        if rng.random() < 0.1:  # persisted and reloaded between cycles
+            state = TAState.from_dict(copy.deepcopy(state.to_dict()))
+        if i + 1 in (25, 26, 49, 50) or i == len(close) - 1:
+            assert_matches_reference(state.indicators(), high[:i + 1], low[:i + 1], close[:i + 1])
+
+
+class _Chart:
+    """get_chart_data over a fixed hourly series, honouring start/end."""
+
+    def __init__(self, start_ms, high, low, close):
+        self.ticks = [start_ms + i * HOUR_MS for i in range(len(close))]
+        self.high, self.low, self.close = high, low, close
+        self.requested = []
+
+    def get_chart_data(self, instrument, resolution, start_ms, end_ms):
+        rows = [i for i, t in enumerate(self.ticks) if start_ms <= t <= end_ms]
+        self.requested.append(len(rows))
+        return {
+            "ticks": [self.ticks[i] for i in rows],
+            "high": [self.high[i] for i in rows],
+            "low": [self.low[i] for i in rows],
+            "close": [self.close[i] for i in rows],
+        }
+
+
+def test_technicals_fold_in_new_bars_and_include_the_forming_one(monkeypatch):
+    rng = random.Random(3)
+    high, low, close = random_bars(rng, 260)
+    chart = _Chart(1_700_000_000_000 // HOUR_MS * HOUR_MS, high, low, close)
+    collector = MarketDataCollector(DeribitClient())
+    collector.deribit = chart
+
+    # Cycles every 15 minutes; a 16-hour outage forces a rebuild from history
+    now = chart.ticks[230] + 60_000
+    rebuilds = []
+    for step in range(16):
+        now += 16 * HOUR_MS if step == 8 else 15 * 60_000
+        monkeypatch.setattr(market_data.time, "time", lambda now=now: now / 1000)
+        got = collector._get_technicals()
+        if chart.requested[-1] > 2:
+            rebuilds.append(step)
+            history_start = now - market_data._TA_HISTORY_BARS * HOUR_MS
+            first = next(i for i, t in enumerate(chart.ticks) if t >= history_start)
+        visible = sum(t <= now for t in chart.ticks)  # closed bars plus the forming one
+        assert_matches_reference(got, high[first:visible], low[first:visible], close[first:visible])
+    assert rebuilds == [0, 8]
@@ -0,0 +1,301 @@
+"""Decision parsing, backfill batches and trade sizing."""
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from agent import trader
+from agent.trader import _extract_json, _parse_decision
+from agent.database import save_account_snapshot, save_insight, save_market_snapshot, save_position_snapshot
+
+DECISION = {
+    "analysis": "Rally into resistance on falling volume.",
+    "sentiment": "BEAR",
+    "confidence": 0.7,
+    "recommended_action": "SHORT",
+    "position_size_pct": 5,
+    "reasoning": "Funding positive, RSI overbought.",
+    "signals_used": ["rsi", "funding"],
+}
+
+
+class _Batches:
+    """Just enough of client.messages.batches for batch_analyze."""
+
+    def __init__(self, results):
+        self.results_by_index = results
+        self.requests = None
+
+    def create(self, requests):
+        self.requests = requests
+        return SimpleNamespace(id="batch-1", processing_status="ended")
+
+    def results(self, batch_id):
+        for request, result in zip(self.requests, self.results_by_index):
+            if result is not None:
+                yield SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+
+def _succeeded(*blocks):
+    return SimpleNamespace(type="succeeded", message=SimpleNamespace(content=list(blocks)))
+
+
+def _block(kind, text=""):
+    return SimpleNamespace(type=kind, text=text)
+
+
+def test_batch_analyze_reports_each_result_type(agent):
+    snaps = []
+    for price in (60000, 61000, 62000, 63000, 64000):
+        snaps.append(save_market_snapshot(agent.db, {"btc_price": price}))
+    snapshots = [dict(r) for r in agent.db.execute("SELECT * FROM market_snapshots ORDER BY id")]
+    errored = SimpleNamespace(
+        type="errored",
+        error=SimpleNamespace(error=SimpleNamespace(type="overloaded_error", message="Overloaded")),
+    )
+    agent.client = SimpleNamespace(messages=SimpleNamespace(batches=_Batches([
+        _succeeded(_block("thinking"), _block("text", json.dumps(DECISION))),
+        errored,
+        SimpleNamespace(type="expired"),
+        SimpleNamespace(type="canceled"),
+        None,  # no result line at all
+    ])))
+
+    decisions = agent.batch_analyze(snapshots)
+
+    assert decisions[0]["recommended_action"] == "SHORT"
+    assert [d["reasoning"] for d in decisions[1:]] == [
+        "batch result errored (overloaded_error: Overloaded)",
+        "batch result expired",
+        "batch result canceled",
+        "batch result missing",
+    ]
+    assert all(d["fallback"] and d["recommended_action"] == "HOLD" for d in decisions[1:])
+
+
+def test_batch_prompts_carry_the_stored_position(agent):
+    first = save_market_snapshot(agent.db, {"btc_price": 60000})
+    save_insight(agent.db, {"market_snapshot_id": first, "analysis": "a", "recommended_action": "HOLD",
+                            "sentiment": "NEUTRAL", "confidence": 0.4})
+    save_market_snapshot(agent.db, {"btc_price": 61000})
+    save_account_snapshot(agent.db, {"equity": 1.25, "available_margin": 1.0})
+    save_position_snapshot(agent.db, {"instrument": "BTC-PERPETUAL", "direction": "sell", "size": -500,
+                                      "avg_entry_price": 60500, "mark_price": 61000,
+                                      "unrealized_pnl": -0.001, "liquidation_price": 90000})
+    # Two cycles 15 minutes apart; the second one held the short
+    agent.db.execute("UPDATE market_snapshots SET ts = '2025-01-01T00:00:00Z' WHERE id = ?", (first,))
+    agent.db.execute("UPDATE agent_insights SET ts = '2025-01-01T00:00:05Z'")
+    for table in ("market_snapshots", "account_snapshots", "positions"):
+        agent.db.execute(f"UPDATE {table} SET ts = '2025-01-01T00:15:02Z' WHERE ts > '2025-01-01T00:00:00Z'")
+    snapshots = [dict(r) for r in agent.db.execute("SELECT * FROM market_snapshots ORDER BY id")]
+    batches = _Batches([None, None])
+    agent.client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+
+    agent.batch_analyze(snapshots)
+
+    first_prompt, second_prompt = (r["params"]["messages"][0]["content"] for r in batches.requests)
+    assert "FLAT (no position)" in first_prompt and "Account data unavailable" in first_prompt
+    assert "- Size: -500.0 USD" in second_prompt
+    assert "- Equity: 1.250000 BTC" in second_prompt
+    assert "HOLD (sentiment: NEUTRAL, confidence: 40%)" in second_prompt
+
+
+class _Stream:
+    """messages.stream stand-in: yields text in chunks; output_tokens is
+    message_start's placeholder until the text is exhausted (message_delta)."""
+
+    def __init__(self, text, output_tokens):
+        self.text, self.output_tokens = text, output_tokens
+        self.current_message_snapshot = SimpleNamespace(usage=SimpleNamespace(input_tokens=900, output_tokens=1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for i in range(0, len(self.text), 16):
+            yield self.text[i:i + 16]
+        self.current_message_snapshot.usage.output_tokens = self.output_tokens
+
+
+def _stream_agent(agent, text, output_tokens):
+    agent.client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **kw: _Stream(text, output_tokens)))
+    return agent._analyze({"btc_price": 60000}, {}, {}, [], [])
+
+
+def test_truncated_reply_steps_the_budget_up_from_max_tokens(agent):
+    agent._tok_ema = 300.0
+    budget = agent._max_tokens()
+    _stream_agent(agent, '{"analysis": "' + "x" * 2000, output_tokens=budget)
+    assert agent._tok_ema == 0.8 * 300.0 + 0.2 * budget
+
+
+def test_early_stop_scales_by_the_last_complete_reply(agent):
+    reply = "```json\n" + json.dumps(DECISION) + "\n```"
+    decision = _stream_agent(agent, reply + "\nMore thoughts.", output_tokens=10**6)
+    assert decision["recommended_action"] == "SHORT"
+    assert agent._chars_per_token == 3.0  # stopped early: nothing measured
+
+    agent._tok_ema = 100.0
+    _stream_agent(agent, "Preamble " * 40, output_tokens=90)  # complete reply, no JSON
+    assert agent._chars_per_token == 360 / 90
+
+    agent._tok_ema = 100.0
+    _stream_agent(agent, reply, output_tokens=10**6)
+    sent = len(reply) - len("\n```")
+    used = -(-sent // 4) + 8
+    assert agent._tok_ema == 0.8 * 100.0 + 0.2 * used
+
+
+def _split_on_fences(text):
+    """The original string-splitting extraction _extract_json replaced."""
+    text = text.strip()
+    if "```" in text:
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+        text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+BODY = json.dumps(DECISION, indent=2)
+
+
+@pytest.mark.parametrize("reply", [
+    BODY,
+    f"```json\n{BODY}\n```",
+    f"```\n{BODY}\n```",
+    f"Here is my decision:\n```json\n{BODY}\n```\nLet me know if you need more.",
+    f"  \n```json{BODY}```  ",
+])
+def test_extract_json_agrees_with_the_fence_splitting_it_replaced(reply):
+    assert _extract_json(reply) == _split_on_fences(reply) == DECISION
+
+
+@pytest.mark.parametrize("reply", [
+    f"Based on the data, my decision is {BODY} and I stand by it.",
+    f"```JSON\n{BODY}\n```",
+    f"```python\nprint(1)\n```\n{BODY}",
+])
+def test_extract_json_finds_the_object_where_splitting_did_not(reply):
+    assert _split_on_fences(reply) != DECISION
+    assert _extract_json(reply) == DECISION
+
+
+def test_extract_json_keeps_braces_inside_strings():
+    decision = {**DECISION, "reasoning": "Range {60k, 65k} holds; watch } and {."}
+    assert _extract_json(f"```json\n{json.dumps(decision)}\n```") == decision
+
+
+@pytest.mark.skipif(trader.json5 is None, reason="json5 not installed")
+def test_extract_json_accepts_near_json():
+    reply = """```json
+{
+  // bearish into resistance
+  "recommended_action": 'SHORT',
+  "position_size_pct": 5,
+  "signals_used": ["rsi", "funding",],
+}
+```"""
+    assert _extract_json(reply) == {"recommended_action": "SHORT", "position_size_pct": 5, "signals_used": ["rsi", "funding"]}
+
+
+@pytest.mark.parametrize("reply", ["", "HOLD. Nothing to do.", "[1, 2, 3]", "```json\n{not json at all\n```", '{"a": 1'])
+def test_extract_json_returns_none_without_an_object(reply):
+    assert _extract_json(reply) is None
+
+
+def test_parse_decision_returns_a_valid_decision_unchanged():
+    assert _parse_decision(f"```json\n{BODY}\n```") == DECISION
+
+
+@pytest.mark.parametrize("change, reason", [
+    ({"recommended_action": "BUY"}, "recommended_action: 'BUY' is not one of"),
+    ({"confidence": 1.5}, "confidence: 1.5 is greater than the maximum of 1"),
+    ({"position_size_pct": -1}, "position_size_pct: -1 is less than the minimum of 0"),
+    ({"position_size_pct": "5"}, "position_size_pct: '5' is not of type 'number'"),
+    ({"signals_used": ["rsi", 3]}, "signals_used/1: 3 is not of type 'string'"),
+    ({"sentiment": None}, "sentiment: None is not one of"),
+])
+def test_parse_decision_holds_on_an_invalid_field(change, reason):
+    reply = json.dumps({**DECISION, **change})
+    decision = _parse_decision(reply)
+    assert decision["recommended_action"] == "HOLD" and decision["position_size_pct"] == 0
+    assert decision["fallback"] is True
+    assert decision["reasoning"].startswith(f"Claude's decision failed validation ({reason}")
+    assert decision["analysis"] == reply[:500]
+
+
+def test_parse_decision_holds_on_a_missing_required_field():
+    partial = {k: v for k, v in DECISION.items() if k != "confidence"}
+    decision = _parse_decision(json.dumps(partial))
+    assert decision["reasoning"] == "Claude's decision failed validation (decision: 'confidence' is a required property)"
+
+
+def test_parse_decision_holds_on_a_reply_without_json():
+    decision = _parse_decision("I'd rather not trade today.")
+    assert decision["reasoning"] == "Failed to parse Claude's response as JSON"
+    assert decision["fallback"] is True and decision["confidence"] == 0.0
+
+
+class _Deribit:
+    """Records the orders _execute sends."""
+
+    def __init__(self, available_funds=0.1):
+        self.available_funds = available_funds
+        self.orders = []
+
+    def get_account_summary(self, currency):
+        return {"available_funds": self.available_funds}
+
+    def sell(self, instrument, amount):
+        self.orders.append(("sell", amount))
+        return {}
+
+    def buy(self, instrument, amount):
+        self.orders.append(("buy", amount))
+        return {}
+
+
+def _order(agent, action, position, size_pct=0, available_funds=0.1):
+    agent.deribit = _Deribit(available_funds)
+    agent._execute({**DECISION, "recommended_action": action, "position_size_pct": size_pct}, None, position)
+    return agent.deribit.orders
+
+
+def test_short_size_matches_the_float_formula(agent):
+    rng = random.Random(21)
+    for _ in range(2000):
+        equity, price = rng.uniform(0.001, 5), rng.uniform(1000, 250000)
+        pct = rng.choice([0, 0.5, 1, 2.5, 5, 10, 12.5, 20, rng.uniform(0, 20)])
+        expected = max(10, int(equity * price * (pct / 100) / 10) * 10)
+        position = {"size": -100, "direction": "sell", "mark_price": price}
+        assert _order(agent, "SHORT", position, pct, equity) == [("sell", expected)]
+
+
+def test_short_size_floors_to_contracts_with_a_minimum(agent):
+    position = {"size": 0, "direction": "none", "mark_price": 60000}
+    assert _order(agent, "SHORT", position, 5, available_funds=0.1) == [("sell", 300)]
+    assert _order(agent, "INCREASE_SHORT", position, 0.1, available_funds=0.1) == [("sell", 10)]
+    assert _order(agent, "SHORT", {"size": 0}, 10, available_funds=0.1) == [("sell", 500)]  # no mark: 50k
+
+
+@pytest.mark.parametrize("size, amount", [
+    (-1000, 500), (-250, 120), (-100, 50), (-30, 10), (-10, 10), (-12345.0, 6170),
+])
+def test_reduce_buys_back_half_in_whole_contracts(agent, size, amount):
+    assert _order(agent, "REDUCE", {"size": size, "direction": "sell"}) == [("buy", amount)]
+    assert amount % 10 == 0
+
+
+def test_hold_and_reduce_without_a_position_send_nothing(agent):
+    assert _order(agent, "REDUCE", {"size": 0, "direction": "none"}) == []
+    assert _order(agent, "HOLD", {"size": -100, "direction": "sell"}) == []